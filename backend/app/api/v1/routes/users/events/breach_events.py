@@ -1,13 +1,46 @@
+import asyncio
+import json
+import time
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Body
+from typing import Any, Dict, List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Body, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.models.user.events.event import BreachEvent
+from pymongo import ASCENDING, DESCENDING
+from app.models.user.events.event import BreachEvent, StatusEnum, SeverityEnum
+from app.models.company.breach_type.breach_type import BreachTypeEnum
 from app.services.users.events.breach_event_service import BreachEventService
+from app.services.users.events.event_bus import BreachEventBus
 from app.utils.logger.logger import Logger
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.json_encoder import CustomJSONEncoder
+
+EXPORT_BATCH_SIZE = 500
+MAX_BULK_EVENTS = 10000
+STREAM_HEARTBEAT_SECONDS = 15
+# Streams end after this long and the browser reconnects, so open streams never hold up a
+# graceful shutdown for longer and reconnects spread clients across workers
+STREAM_MAX_SECONDS = 300
+STREAM_RETRY_MS = 3000
 
 class ResolutionRequest(BaseModel):
     notes: str = ''
 
+class BulkEventFilter(BaseModel):
+    user_id: Optional[str] = None
+    company_id: Optional[str] = None
+    status: Optional[List[StatusEnum]] = None
+    severity: Optional[List[SeverityEnum]] = None
+    breach_type: Optional[List[BreachTypeEnum]] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+class BulkStatusRequest(BaseModel):
+    event_ids: Optional[List[str]] = None
+    filter: Optional[BulkEventFilter] = None
+    status: StatusEnum = StatusEnum.CLOSED
+    resolution_notes: str = ''
+
 class ManualBreachEvent(BaseModel):
     user_id: str
     breach_type: str
@@ -28,11 +61,16 @@ router = APIRouter(
 @router.get("/",
          response_model=dict,
          summary="Get all breach events",
-         description="Retrieve all breach events.")
-async def get_all_breach_events():
+         description="""Retrieve breach events, newest first. Pass `next_cursor` back as `cursor` to get the next page.
+
+         Events closed long ago are archived; set `include_archived=true` to include them.
+         """)
+async def get_all_breach_events(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                cursor: Optional[str] = None,
+                                include_archived: bool = False):
     try:
-        events = await BreachEventService.get_all_breach_events()
-        return {"status": "success", "data": events or []}
+        events, next_page = await BreachEventService.get_all_breach_events(limit, cursor, include_archived)
+        return {"status": "success", "data": events, "next_cursor": next_page}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -86,20 +124,181 @@ async def create_breach_event(event: BreachEvent):
         Logger.error(f"Error creating breach event: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/bulk",
+          response_model=dict,
+          summary="Create many breach events at once",
+          description="""Create up to 10,000 breach events in one request.
+
+          Each item is validated and inserted independently. The response reports the outcome
+          of every item by its position in the request, and each affected user's reference
+          score is recomputed once for the whole batch.
+          """)
+async def create_breach_events_bulk(events: List[Dict[str, Any]] = Body(...)):
+    if len(events) > MAX_BULK_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_EVENTS} events per request")
+    try:
+        result = await BreachEventService.create_breach_events_bulk(events)
+        return {"status": "success", "data": result}
+    except Exception as e:
+        Logger.error(f"Error creating breach events in bulk: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/bulk/resolve",
+          response_model=dict,
+          summary="Resolve or change the status of many breach events",
+          description="""Set `status` (CLOSED by default) and `resolution_notes` on many events in one write.
+
+          Select the events either with `event_ids` or with a `filter` (the same fields as
+          `/search`), not both. The response reports `updated`, `not_found` or `invalid_id`
+          for every requested id, or `updated` for every event the filter matched.
+          """)
+async def bulk_set_status(request: BulkStatusRequest):
+    if (request.event_ids is None) == (request.filter is None):
+        raise HTTPException(status_code=400, detail="Provide either event_ids or filter")
+    if request.event_ids is not None and len(request.event_ids) > MAX_BULK_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_EVENTS} events per request")
+    query = None
+    if request.filter is not None:
+        query = BreachEventService.build_filter(**request.filter.model_dump())
+        if not query:
+            raise HTTPException(status_code=400, detail="Filter must restrict at least one field")
+    try:
+        result = await BreachEventService.set_status_bulk(request.status, request.resolution_notes,
+                                                          request.event_ids, query, MAX_BULK_EVENTS)
+        return {"status": "success", "data": result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        Logger.error(f"Error changing breach event status in bulk: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.get("/unresolved",
          response_model=dict,
          summary="Get all unresolved breach events",
          description="Retrieve all breach events that have not been resolved.")
-async def get_unresolved_events():
+async def get_unresolved_events(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                cursor: Optional[str] = None):
     try:
-        events = await BreachEventService.get_unresolved_events()
-        return {"status": "success", "data": events or []}
+        events, next_page = await BreachEventService.get_unresolved_events(limit, cursor)
+        return {"status": "success", "data": events, "next_cursor": next_page}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         Logger.error(f"Error getting unresolved events: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.get("/search",
+         response_model=dict,
+         summary="Search breach events",
+         description="""Filter breach events on the server and return them a page at a time.
+
+         `severity`, `status` and `breach_type` may be repeated to match any of several values,
+         e.g. `?severity=HIGH&severity=CRITICAL&status=OPEN&breach_type=FRAUD&company_id=COMP123`.
+         `start` (inclusive) and `end` (exclusive) bound the event timestamp. Results are ordered
+         by timestamp, newest first unless `order=asc`. Pass `next_cursor` back as `cursor`, with
+         the same filters, to get the next page. `explain=true` adds the query plan that was used.
+         `include_archived=true` also searches events that have been archived.
+         """)
+async def search_breach_events(severity: Optional[List[SeverityEnum]] = Query(None),
+                               status: Optional[List[StatusEnum]] = Query(None),
+                               breach_type: Optional[List[BreachTypeEnum]] = Query(None),
+                               company_id: Optional[str] = None,
+                               user_id: Optional[str] = None,
+                               start: Optional[datetime] = None,
+                               end: Optional[datetime] = None,
+                               order: Literal["asc", "desc"] = "desc",
+                               limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                               cursor: Optional[str] = None,
+                               explain: bool = False,
+                               include_archived: bool = False):
+    try:
+        query = BreachEventService.build_filter(user_id, company_id, status, start, end, severity, breach_type)
+        direction = ASCENDING if order == "asc" else DESCENDING
+        result = await BreachEventService.search_breach_events(query, direction, limit, cursor, explain,
+                                                               include_archived)
+        response = {"status": "success", "data": result['events'], "next_cursor": result['next_cursor']}
+        if explain:
+            response["explain"] = result['explain']
+        return response
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        Logger.error(f"Error searching breach events: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/export",
+         summary="Export breach events as NDJSON",
+         description="""Stream matching breach events, newest first, as newline-delimited JSON.
+
+         Events are read from the database in batches and written out as they arrive,
+         so the export size is not limited by server memory.
+         """)
+async def export_breach_events(user_id: Optional[str] = None,
+                               company_id: Optional[str] = None,
+                               status: Optional[StatusEnum] = None,
+                               start: Optional[datetime] = None,
+                               end: Optional[datetime] = None,
+                               batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+                               include_archived: bool = False):
+    query = BreachEventService.build_filter(user_id, company_id, status, start, end)
+
+    async def ndjson_lines():
+        lines = []
+        try:
+            async for event in BreachEventService.iter_breach_events(query, batch_size, include_archived):
+                lines.append(json.dumps(CustomJSONEncoder.encode(event)))
+                if len(lines) >= batch_size:
+                    yield '\n'.join(lines) + '\n'
+                    lines = []
+            if lines:
+                yield '\n'.join(lines) + '\n'
+        except Exception as e:
+            # Headers are already sent, so the error can only be logged and the stream cut short
+            Logger.error(f"Error exporting breach events: {str(e)}")
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+def _sse(event_type: str, data: Any) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(CustomJSONEncoder.encode(data))}\n\n"
+
+@router.get("/stream",
+         summary="Stream breach event changes (Server-Sent Events)",
+         description="""Push `created`, `updated`, `resolved` and `deleted` notifications for breach events
+         as they are written, optionally only those with the given status or company.
+
+         Load the current state once through the paginated listings, then apply the pushed
+         changes. A `resync` event means notifications were dropped because the client fell
+         behind, and the listing should be fetched again. Comment lines are sent as heartbeats.
+         """)
+async def stream_breach_events(request: Request,
+                               status: Optional[StatusEnum] = None,
+                               company_id: Optional[str] = None):
+    async def sse_messages():
+        subscription = BreachEventBus.subscribe(status, company_id)
+        reported_drops = 0
+        ends_at = time.monotonic() + STREAM_MAX_SECONDS
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            while time.monotonic() < ends_at:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    return
+                if subscription.dropped > reported_drops:
+                    yield _sse("resync", {"dropped": subscription.dropped - reported_drops})
+                    reported_drops = subscription.dropped
+                yield _sse(message['type'], message['event'])
+        finally:
+            BreachEventBus.unsubscribe(subscription)
+
+    return StreamingResponse(sse_messages(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @router.get("/{event_id}",
          response_model=dict,
          summary="Get a breach event by ID",
@@ -111,12 +310,14 @@ async def get_unresolved_events():
          * Description and timestamps
          * Resolution status
          """)
-async def get_breach_event(event_id: str):
+async def get_breach_event(event_id: str, include_archived: bool = False):
     try:
-        event = await BreachEventService.get_breach_event(event_id)
+        event = await BreachEventService.get_breach_event(event_id, include_archived)
         if not event:
             raise HTTPException(status_code=404, detail="Breach event not found")
         return {"status": "success", "data": event}
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -128,18 +329,19 @@ async def get_breach_event(event_id: str):
          summary="Get all breach events for a user",
          description="""Retrieve all breach events associated with a specific user.
 
-         Returns a list of breach events, each containing:
+         Returns a page of breach events, newest first, each containing:
          * Breach details and type
          * Company information
          * Severity and status
          * Resolution information
          """)
-async def get_user_breach_events(user_id: str):
+async def get_user_breach_events(user_id: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                 cursor: Optional[str] = None, include_archived: bool = False):
     try:
-        events = await BreachEventService.get_user_breach_events(user_id)
-        if not events:
-            return {"status": "success", "data": []}
-        return {"status": "success", "data": events}
+        events, next_page = await BreachEventService.get_user_breach_events(user_id, limit, cursor, include_archived)
+        return {"status": "success", "data": events, "next_cursor": next_page}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         Logger.error(f"Error getting user breach events: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -148,12 +350,14 @@ async def get_user_breach_events(user_id: str):
          response_model=dict,
          summary="Get all breach events for a company",
          description="Retrieve all breach events associated with a specific company.")
-async def get_company_breach_events(company_id: str):
+async def get_company_breach_events(company_id: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                    cursor: Optional[str] = None, include_archived: bool = False):
     try:
-        events = await BreachEventService.get_company_breach_events(company_id)
-        if not events:
-            return {"status": "success", "data": []}
-        return {"status": "success", "data": events}
+        events, next_page = await BreachEventService.get_company_breach_events(company_id, limit, cursor,
+                                                                               include_archived)
+        return {"status": "success", "data": events, "next_cursor": next_page}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         Logger.error(f"Error getting company breach events: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -196,17 +400,3 @@ async def resolve_breach_event(event_id: str):
     if not resolved:
         raise HTTPException(status_code=404, detail="Event not found")
     return {"status": "success", "data": resolved}
-
-@router.get("/unresolved",
-         response_model=dict,
-         summary="Get all unresolved breach events",
-         description="Retrieve all breach events that have not been resolved.")
-async def get_unresolved_events():
-    try:
-        events = await BreachEventService.get_unresolved_events()
-        return {"status": "success", "data": events or []}
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        Logger.error(f"Error getting unresolved events: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
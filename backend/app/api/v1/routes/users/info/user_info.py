@@ -1,5 +1,9 @@
 from fastapi import APIRouter, HTTPException
 from app.services.users.info.user_info import UserInfoService
+from app.services.users.info.ipcheck import IPCheckService
+from app.services.users.info.provider_ranges import ProviderRanges
+from app.services.users.info.geoip import GeoIP
+from app.services.users.info.ip_reputation import IPReputationStore
 from app.models.user.info.ipcheck import IPCheckResult
 from typing import List, Optional
 
@@ -69,3 +73,45 @@ async def get_user_risk_score(user_id: str):
         return {"user_id": user_id, "risk_score": score}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/ip-cache")
+async def get_ip_cache_stats():
+    return IPCheckService.stats()
+
+@router.delete("/ip-cache")
+async def flush_ip_cache(ip_address: Optional[str] = None, persistent: bool = False):
+    flushed = IPCheckService.flush_cache(ip_address)
+    response = {"message": "IP cache flushed", "flushed": flushed}
+    if persistent:
+        deleted = await IPReputationStore.delete(ip_address)
+        if deleted is None:
+            raise HTTPException(status_code=503, detail="IP reputation store is unavailable")
+        response["deleted_from_store"] = deleted
+    return response
+
+@router.get("/geoip")
+async def get_geoip_stats():
+    return GeoIP.stats()
+
+@router.get("/geoip/{ip_address}")
+async def lookup_geoip(ip_address: str):
+    if not GeoIP.enabled():
+        raise HTTPException(status_code=404, detail="GeoIP database is not configured")
+    try:
+        record = GeoIP.lookup(ip_address)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if record is None:
+        raise HTTPException(status_code=404, detail="IP not found in GeoIP database")
+    return {"ip_address": ip_address, **record}
+
+@router.get("/provider-ranges")
+async def get_provider_ranges():
+    return ProviderRanges.stats()
+
+@router.post("/provider-ranges/reload")
+async def reload_provider_ranges():
+    try:
+        return await ProviderRanges.reload()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
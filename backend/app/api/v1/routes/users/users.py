@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Request
 from app.services.users.user_service import UserService
+from app.services.users.scoring.rescore_job import RiskRescoreJob, RescoreJobRunningError
 from app.models.user.user import User
 from app.models.response import ApiResponse
 from typing import List
@@ -49,24 +50,36 @@ async def create_user(user: User, request: Request):
 @router.get("/score/{passport_string}")
 async def get_user_ref_score(passport_string: str):
     try:
-        Logger.info(f"Getting reference score for user {passport_string}")
-        user = await UserService.get_user(passport_string)
-        if not user:
+        scores = await UserService.get_scores(passport_string)
+        if scores is None:
             Logger.error(f"User {passport_string} not found")
             raise HTTPException(status_code=404, detail="User not found")
-        ref_score = await UserService.set_user_risk_score(str(user.id))
-        if ref_score is None:
-            Logger.error(f"Failed to calculate reference score for user {passport_string}")
-            raise HTTPException(status_code=500, detail="Failed to calculate reference score")
-
-        Logger.info(f"Successfully got reference score {ref_score} for user {passport_string}")
-        return ApiResponse(data=ref_score)
+        return ApiResponse(data=scores)
     except HTTPException as e:
         raise e
     except Exception as e:
         Logger.error(f"Error getting reference score for user {passport_string}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.post("/rescore", status_code=202)
+async def start_rescore(restart: bool = False):
+    """Recompute every user's reference score in the background, resuming an unfinished run unless restart is set."""
+    try:
+        job = await RiskRescoreJob.start(restart)
+        return ApiResponse(data=job, message="Rescore started")
+    except RescoreJobRunningError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        Logger.error(f"Error starting rescore: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/rescore")
+async def get_rescore_status():
+    job = await RiskRescoreJob.status()
+    if not job:
+        raise HTTPException(status_code=404, detail="No rescore has been run")
+    return ApiResponse(data=job)
+
 @router.get("/risk/{passport_string}")
 async def get_user_risk(passport_string: str, request: Request):
     try:
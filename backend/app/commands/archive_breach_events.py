@@ -0,0 +1,30 @@
+"""Move breach events that were closed more than N days ago into breach_events_archive.
+
+    PYTHONPATH=. python -m app.commands.archive_breach_events --older-than-days 90
+"""
+import argparse
+import asyncio
+import os
+from app.core.db.db import MongoDB
+from app.services.users.events.breach_event_service import BreachEventService
+
+
+async def main(older_than_days: int, batch_size: int):
+    await MongoDB.initialize()
+    if MongoDB.db is None:
+        raise SystemExit('MongoDB is not reachable, set MONGODB_URL')
+    try:
+        result = await BreachEventService.archive_closed_events(older_than_days, batch_size)
+        print(f'✅ Archived {result["archived"]} events closed before {result["cutoff"]:%Y-%m-%d %H:%M} '
+              f'in {result["batches"]} batches')
+    finally:
+        MongoDB.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--older-than-days', type=int,
+                        default=int(os.getenv('BREACH_EVENT_ARCHIVE_AFTER_DAYS', '90')))
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.older_than_days, args.batch_size))
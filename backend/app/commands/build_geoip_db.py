@@ -0,0 +1,34 @@
+"""Build the memory-mapped GeoIP/ASN database that GEOIP_DB_PATH points at, from a CSV dump.
+
+    PYTHONPATH=. python -m app.commands.build_geoip_db ranges.csv --output app/data/geoip.db
+
+The CSV needs a header row; see app.services.users.info.geoip.read_csv for the columns.
+The output is replaced atomically, running workers pick it up when they restart.
+"""
+import argparse
+import os
+import time
+from app.services.users.info.geoip import GeoIPDatabase, read_csv, write_database
+
+
+def main(csv_path: str, output: str):
+    start = time.perf_counter()
+    ranges, skipped = read_csv(csv_path)
+    if not ranges:
+        raise SystemExit(f'No valid ranges in {csv_path}')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    result = write_database(ranges, output)
+    # Open what was written, so a broken file fails here rather than in the app
+    database = GeoIPDatabase(output)
+    print(f'✅ Wrote {database.ipv4_count} IPv4 and {database.ipv6_count} IPv6 ranges to {output} '
+          f'({os.path.getsize(output) / 1e6:.1f} MB) in {time.perf_counter() - start:.1f} s')
+    if skipped or result['overlapping']:
+        print(f'⚠️ Skipped {skipped} invalid rows and {result["overlapping"]} overlapping ranges')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv_path')
+    parser.add_argument('--output', default=os.getenv('GEOIP_DB_PATH') or 'app/data/geoip.db')
+    args = parser.parse_args()
+    main(args.csv_path, args.output)
@@ -0,0 +1,87 @@
+"""Fetch reputations for a list of known IPs into the ip_reputation store ahead of traffic.
+
+The file holds one IP per line (a CSV's first column also works, # starts a comment).
+IPs that already have a fresh stored reputation are skipped, unless --refresh is set.
+
+    PYTHONPATH=. python -m app.commands.prewarm_ip_reputation known_ips.txt --concurrency 8
+"""
+import argparse
+import asyncio
+import ipaddress
+import time
+from typing import List
+from app.core.db.db import MongoDB
+from app.core.db.indexes import ensure_indexes
+from app.core.http.client import HTTPClient
+from app.services.users.info.ip_reputation import IPReputationStore
+from app.services.users.info.ipcheck import IPCheckService
+
+CHUNK_SIZE = 1000
+
+
+def read_ips(path: str) -> List[str]:
+    ips = {}
+    invalid = 0
+    with open(path) as f:
+        for line in f:
+            value = line.split('#', 1)[0].split(',', 1)[0].strip()
+            if not value:
+                continue
+            try:
+                ip = ipaddress.ip_address(value)
+            except ValueError:
+                invalid += 1
+                continue
+            # Private addresses never reach the provider
+            if not ip.is_private:
+                ips[str(ip)] = None
+    if invalid:
+        print(f'⚠️ Skipped {invalid} lines that are not IP addresses')
+    return list(ips)
+
+
+async def main(path: str, concurrency: int, refresh: bool):
+    await MongoDB.initialize()
+    if MongoDB.db is None:
+        raise SystemExit('MongoDB is not reachable, set MONGODB_URL')
+    ips = read_ips(path)
+    semaphore = asyncio.Semaphore(concurrency)
+    totals = {'ips': len(ips), 'already_stored': 0, 'fetched': 0, 'stored': 0, 'failed': 0}
+    start = time.perf_counter()
+
+    async def fetch(ip_address):
+        async with semaphore:
+            return ip_address, await IPCheckService.fetch(ip_address)
+
+    try:
+        await ensure_indexes(MongoDB.db)
+        for offset in range(0, len(ips), CHUNK_SIZE):
+            chunk = ips[offset:offset + CHUNK_SIZE]
+            if not refresh:
+                stored = set(await IPReputationStore.fresh_ips(chunk))
+                totals['already_stored'] += len(stored)
+                chunk = [ip for ip in chunk if ip not in stored]
+
+            results = await asyncio.gather(*(fetch(ip) for ip in chunk))
+            succeeded = [(ip, result) for ip, (result, ok) in results if ok]
+            if succeeded:
+                totals['stored'] += await IPReputationStore.put_many(succeeded)
+            totals['fetched'] += len(succeeded)
+            totals['failed'] += len(results) - len(succeeded)
+            print(f'{min(offset + CHUNK_SIZE, len(ips))}/{len(ips)} IPs, {totals["fetched"]} fetched, '
+                  f'{totals["already_stored"]} already stored, {totals["failed"]} failed')
+
+        print(f'✅ Prewarmed {totals["stored"]} of {totals["fetched"]} fetched IP reputations in {time.perf_counter() - start:.1f} s, '
+              f'{IPCheckService.upstream_calls} provider calls')
+    finally:
+        await HTTPClient.close()
+        MongoDB.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--refresh', action='store_true', help='refetch IPs that are already stored')
+    args = parser.parse_args()
+    asyncio.run(main(args.path, args.concurrency, args.refresh))
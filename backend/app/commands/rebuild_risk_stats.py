@@ -0,0 +1,38 @@
+"""Recompute every user's risk_stats and ref_score from their breach events, archived ones included.
+
+Resumes an interrupted run from its last checkpoint; pass --restart to start over.
+
+    PYTHONPATH=. python -m app.commands.rebuild_risk_stats [--restart] [--chunk-size 1000]
+"""
+import argparse
+import asyncio
+from app.core.db.db import MongoDB
+from app.services.users.scoring.rescore_job import RiskRescoreJob, RescoreJobRunningError
+
+
+def print_progress(job):
+    total = job.get('total') or 0
+    percent = f'{job["processed"] / total * 100:5.1f}%' if total else '     '
+    print(f'  {percent}  {job["processed"]} users processed, {job["updated"]} changed', flush=True)
+
+
+async def main(restart: bool, chunk_size: int):
+    await MongoDB.initialize()
+    if MongoDB.db is None:
+        raise SystemExit('MongoDB is not reachable, set MONGODB_URL')
+    try:
+        job = await RiskRescoreJob.run(restart, chunk_size, print_progress)
+        elapsed = (job['updated_at'] - job['started_at']).total_seconds()
+        print(f'✅ Rebuilt risk stats for {job["processed"]} users ({job["updated"]} changed) in {elapsed:.0f}s')
+    except RescoreJobRunningError as e:
+        raise SystemExit(str(e))
+    finally:
+        MongoDB.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint of an unfinished run')
+    parser.add_argument('--chunk-size', type=int, default=RiskRescoreJob.CHUNK_SIZE)
+    args = parser.parse_args()
+    asyncio.run(main(args.restart, args.chunk_size))
@@ -2,16 +2,39 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from typing import Optional
+from app.core.db.pool_metrics import PoolMetricsListener
+from app.core.http.client import HTTPClient
 import os
 load_dotenv()
 class MongoDB:
     client: Optional[AsyncIOMotorClient] = None
     db = None
+    pool_metrics = PoolMetricsListener()
+
+    # Connection pool settings, see https://pymongo.readthedocs.io/en/stable/api/pymongo/mongo_client.html
+    MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '100'))
+    MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+    WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '0')) or None
+    SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '30000'))
+
+    @classmethod
+    def pool_options(cls) -> dict:
+        return {
+            'maxPoolSize': cls.MAX_POOL_SIZE,
+            'minPoolSize': cls.MIN_POOL_SIZE,
+            'waitQueueTimeoutMS': cls.WAIT_QUEUE_TIMEOUT_MS,
+            'serverSelectionTimeoutMS': cls.SERVER_SELECTION_TIMEOUT_MS,
+        }
 
     @classmethod
     async def initialize(cls, db_name: str = 'team15'):
         try:
-            cls.client = AsyncIOMotorClient(os.getenv('MONGODB_URL'))
+            cls.pool_metrics.reset()
+            cls.client = AsyncIOMotorClient(
+                os.getenv('MONGODB_URL'),
+                event_listeners=[cls.pool_metrics],
+                **cls.pool_options()
+            )
             cls.db = cls.client[db_name]
             await cls.client.admin.command('ping')
             print('✅ Successfully connected to MongoDB!')
@@ -32,8 +55,28 @@ class MongoDB:
 
 @asynccontextmanager
 async def get_db(app):
+    from app.core.db.indexes import ensure_indexes, verify_indexes
+    from app.services.users.scoring.score_queue import RiskScoreQueue
+    from app.services.users.events.event_bus import BreachEventBus
+    from app.services.users.scoring.rescore_job import RiskRescoreJob
+    from app.services.users.info.enrichment_queue import DeviceEnrichmentQueue
+    from app.services.users.info.provider_ranges import ProviderRanges
     try:
         await MongoDB.initialize()
+        if MongoDB.db is not None:
+            await ensure_indexes(MongoDB.db)
+            await verify_indexes(MongoDB.db)
+        HTTPClient.initialize()
+        ProviderRanges.start()
+        RiskScoreQueue.start()
+        DeviceEnrichmentQueue.start()
         yield {"mongodb": MongoDB}
     finally:
+        BreachEventBus.close()
+        await RiskRescoreJob.cancel()
+        await ProviderRanges.stop()
+        # Flush queued score updates and enrichments while the connections are still open
+        await RiskScoreQueue.drain()
+        await DeviceEnrichmentQueue.drain()
         MongoDB.close()
+        await HTTPClient.close()
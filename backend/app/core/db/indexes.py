@@ -0,0 +1,239 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from app.utils.logger.logger import Logger
+from app.services.users.info.ip_reputation import IPReputationStore
+from dotenv import load_dotenv
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+import os
+
+load_dotenv()
+
+# Every index the services rely on, keyed by collection name. create_indexes is a
+# no-op for indexes that already exist with the same spec, so this runs on every startup.
+INDEXES: Dict[str, List[IndexModel]] = {
+    'users': [
+        IndexModel([('passport_string', ASCENDING)], name='passport_string_unique', unique=True),
+    ],
+    'breach_events': [
+        # Listings page by (timestamp, _id), so _id is part of every sort key
+        IndexModel([('user_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='user_id_timestamp_id'),
+        IndexModel([('company_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='company_id_timestamp_id'),
+        IndexModel([('status', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='status_timestamp_id'),
+        IndexModel([('timestamp', DESCENDING), ('_id', DESCENDING)], name='timestamp_id'),
+        # /breach-events/search: equality (or $in) fields first, then the sort key, which also
+        # serves the timestamp range. Filters not in the index are applied to the fetched documents.
+        IndexModel([('company_id', ASCENDING), ('status', ASCENDING), ('severity', ASCENDING),
+                    ('timestamp', DESCENDING), ('_id', DESCENDING)], name='company_id_status_severity_timestamp_id'),
+        IndexModel([('status', ASCENDING), ('severity', ASCENDING),
+                    ('timestamp', DESCENDING), ('_id', DESCENDING)], name='status_severity_timestamp_id'),
+        IndexModel([('breach_type', ASCENDING), ('severity', ASCENDING),
+                    ('timestamp', DESCENDING), ('_id', DESCENDING)], name='breach_type_severity_timestamp_id'),
+        # Archival job: CLOSED events by how long ago they were resolved
+        IndexModel([('status', ASCENDING), ('resolution_timestamp', ASCENDING)], name='status_resolution_timestamp'),
+    ],
+    # Cold tier, only read with include_archived, so it carries just the listing indexes
+    'breach_events_archive': [
+        IndexModel([('user_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='user_id_timestamp_id'),
+        IndexModel([('company_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='company_id_timestamp_id'),
+        IndexModel([('timestamp', DESCENDING), ('_id', DESCENDING)], name='timestamp_id'),
+    ],
+    'user_info': [
+        IndexModel([('user_id', ASCENDING), ('ip_address', ASCENDING)], name='user_id_ip_address_unique', unique=True),
+        IndexModel([('ip_address', ASCENDING)], name='ip_address'),
+    ],
+    IPReputationStore.collection_name: [
+        IndexModel([('fetched_at', ASCENDING)], name='fetched_at_ttl', expireAfterSeconds=IPReputationStore.TTL_SECONDS),
+    ],
+    'companies': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+    ],
+    'company_breaches': [
+        IndexModel([('company_id', ASCENDING)], name='company_id_unique', unique=True),
+        IndexModel([('effect_score', DESCENDING)], name='effect_score'),
+    ],
+}
+
+# Representative query shapes issued by the services. Each one is explained at startup
+# and must be answered by an index rather than a collection scan.
+QUERY_CHECKS: List[Dict[str, Any]] = [
+    {
+        'name': 'UserService.get_user',
+        'collection': 'users',
+        'filter': {'passport_string': 'PS001'},
+    },
+    {
+        'name': 'BreachEventService.get_all_breach_events',
+        'collection': 'breach_events',
+        'filter': {},
+        'sort': [('timestamp', DESCENDING), ('_id', DESCENDING)],
+    },
+    {
+        'name': 'BreachEventService.get_user_breach_events',
+        'collection': 'breach_events',
+        'filter': {'user_id': 'PS001'},
+        'sort': [('timestamp', DESCENDING), ('_id', DESCENDING)],
+    },
+    {
+        'name': 'BreachEventService.get_company_breach_events',
+        'collection': 'breach_events',
+        'filter': {'company_id': 'COMP123'},
+        'sort': [('timestamp', DESCENDING), ('_id', DESCENDING)],
+    },
+    {
+        'name': 'BreachEventService.get_unresolved_events',
+        'collection': 'breach_events',
+        'filter': {'status': {'$ne': 'CLOSED'}},
+        'sort': [('timestamp', DESCENDING), ('_id', DESCENDING)],
+    },
+    {
+        'name': 'BreachEventService.search_breach_events (company triage)',
+        'collection': 'breach_events',
+        'filter': {'company_id': 'COMP123', 'status': 'OPEN', 'severity': {'$in': ['HIGH', 'CRITICAL']},
+                   'breach_type': 'FRAUD', 'timestamp': {'$gte': datetime(2024, 1, 1)}},
+        'sort': [('timestamp', DESCENDING), ('_id', DESCENDING)],
+    },
+    {
+        'name': 'BreachEventService.search_breach_events (status triage)',
+        'collection': 'breach_events',
+        'filter': {'status': {'$in': ['OPEN', 'IN_PROGRESS']}, 'severity': 'CRITICAL'},
+        'sort': [('timestamp', DESCENDING), ('_id', DESCENDING)],
+    },
+    {
+        'name': 'BreachEventService.search_breach_events (breach type)',
+        'collection': 'breach_events',
+        'filter': {'breach_type': 'DATA_LEAK', 'severity': {'$in': ['HIGH', 'CRITICAL']}},
+        'sort': [('timestamp', DESCENDING), ('_id', DESCENDING)],
+    },
+    {
+        'name': 'BreachEventService.archive_closed_events',
+        'collection': 'breach_events',
+        'filter': {'status': 'CLOSED', 'resolution_timestamp': {'$lt': datetime(2024, 1, 1)}},
+        'sort': [('resolution_timestamp', ASCENDING)],
+    },
+    {
+        'name': 'BreachEventService.get_user_breach_events (archive)',
+        'collection': 'breach_events_archive',
+        'filter': {'user_id': 'PS001'},
+        'sort': [('timestamp', DESCENDING), ('_id', DESCENDING)],
+    },
+    {
+        'name': 'UserInfoService.add_device',
+        'collection': 'user_info',
+        'filter': {'user_id': 'PS001', 'ip_address': '127.0.0.1'},
+    },
+    {
+        'name': 'UserInfoService.enrich_ip',
+        'collection': 'user_info',
+        'filter': {'ip_address': '127.0.0.1'},
+    },
+    {
+        'name': 'UserInfoService.get_user_devices',
+        'collection': 'user_info',
+        'filter': {'user_id': 'PS001'},
+    },
+    {
+        'name': 'CompanyService.get_company',
+        'collection': 'companies',
+        'filter': {'id': 'COMP123'},
+    },
+    {
+        'name': 'CompanyBreachService.get_breach_by_company',
+        'collection': 'company_breaches',
+        'filter': {'company_id': 'COMP123'},
+    },
+    {
+        'name': 'CompanyBreachService.get_high_impact_breaches',
+        'collection': 'company_breaches',
+        'filter': {'effect_score': {'$gte': 70}},
+    },
+]
+
+
+class IndexVerificationError(RuntimeError):
+    pass
+
+
+def _plan_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    if 'inputStage' in plan:
+        yield from _plan_nodes(plan['inputStage'])
+    for child in plan.get('inputStages', []):
+        yield from _plan_nodes(child)
+    # Slot-based engine wraps the classic plan under queryPlan
+    if 'queryPlan' in plan:
+        yield from _plan_nodes(plan['queryPlan'])
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten an explain() winning plan into the list of stage names it contains."""
+    return [node.get('stage', '') for node in _plan_nodes(plan)]
+
+
+def winning_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    planner = explain.get('queryPlanner', {})
+    return planner.get('winningPlan', {})
+
+
+def plan_summary(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Condense explain() output into the stages, indexes and work done by the winning plan."""
+    plan = winning_plan(explain)
+    stages = _plan_stages(plan)
+    summary = {
+        'stages': stages,
+        'indexes': list(dict.fromkeys(node['indexName'] for node in _plan_nodes(plan) if 'indexName' in node)),
+        'collection_scan': 'COLLSCAN' in stages,
+        'in_memory_sort': 'SORT' in stages,
+    }
+    execution = explain.get('executionStats')
+    if execution:
+        summary['execution'] = {
+            'returned': execution.get('nReturned'),
+            'keys_examined': execution.get('totalKeysExamined'),
+            'docs_examined': execution.get('totalDocsExamined'),
+            'time_ms': execution.get('executionTimeMillis'),
+        }
+    return summary
+
+
+async def ensure_indexes(db) -> None:
+    for collection_name, indexes in INDEXES.items():
+        try:
+            created = await db[collection_name].create_indexes(indexes)
+            Logger.info(f'Indexes ready on {collection_name}: {", ".join(created)}')
+        except OperationFailure as e:
+            # Usually an existing index with the same name but a different spec,
+            # or duplicate data blocking a unique index.
+            Logger.error(f'Failed to create indexes on {collection_name}: {str(e)}')
+
+
+async def verify_indexes(db, strict: bool = None) -> List[str]:
+    """Explain every registered query shape and report the ones that scan a whole collection.
+
+    In strict mode (MONGODB_STRICT_INDEXES=true) a collection scan aborts startup,
+    otherwise it is logged as a warning.
+    """
+    if strict is None:
+        strict = os.getenv('MONGODB_STRICT_INDEXES', 'false').lower() == 'true'
+
+    scans = []
+    for check in QUERY_CHECKS:
+        cursor = db[check['collection']].find(check['filter'])
+        if check.get('sort'):
+            cursor = cursor.sort(check['sort'])
+        try:
+            explain = await cursor.explain()
+        except OperationFailure as e:
+            Logger.error(f'Could not explain {check["name"]}: {str(e)}')
+            continue
+
+        stages = _plan_stages(winning_plan(explain))
+        if 'COLLSCAN' in stages:
+            scans.append(check['name'])
+            Logger.warning(f'{check["name"]} on {check["collection"]} uses a collection scan: {stages}')
+
+    if scans and strict:
+        raise IndexVerificationError(f'Queries without index support: {", ".join(scans)}')
+    if not scans:
+        Logger.info(f'All {len(QUERY_CHECKS)} service queries are index-backed')
+    return scans
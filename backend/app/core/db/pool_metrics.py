@@ -0,0 +1,106 @@
+from pymongo import monitoring
+from threading import Lock
+from typing import Any, Dict
+
+# Upper bounds (milliseconds) of the checkout wait-time histogram buckets
+WAIT_TIME_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Collects connection pool statistics from pymongo's pool events.
+
+    Events are delivered on pymongo's background threads, so counters are guarded by a lock.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.connections_open = 0
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.pools_cleared = 0
+            self.wait_time_total_ms = 0.0
+            self.wait_time_max_ms = 0.0
+            self.wait_time_buckets = [0] * (len(WAIT_TIME_BUCKETS_MS) + 1)
+
+    def _record_wait(self, duration_s: float):
+        wait_ms = duration_s * 1000
+        self.wait_time_total_ms += wait_ms
+        self.wait_time_max_ms = max(self.wait_time_max_ms, wait_ms)
+        for i, bound in enumerate(WAIT_TIME_BUCKETS_MS):
+            if wait_ms <= bound:
+                self.wait_time_buckets[i] += 1
+                return
+        self.wait_time_buckets[-1] += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+            self.connections_open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+            self.connections_open = max(0, self.connections_open - 1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            self._record_wait(event.duration)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self._record_wait(event.duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = self.checkouts + self.checkout_failures
+            histogram = {f'le_{bound}ms': count for bound, count in zip(WAIT_TIME_BUCKETS_MS, self.wait_time_buckets)}
+            histogram[f'gt_{WAIT_TIME_BUCKETS_MS[-1]}ms'] = self.wait_time_buckets[-1]
+            return {
+                'checked_out': self.checked_out,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'connections': {
+                    'open': self.connections_open,
+                    'created': self.connections_created,
+                    'closed': self.connections_closed,
+                    'pools_cleared': self.pools_cleared,
+                },
+                'wait_time_ms': {
+                    'avg': round(self.wait_time_total_ms / waits, 3) if waits else 0.0,
+                    'max': round(self.wait_time_max_ms, 3),
+                    'histogram': histogram,
+                },
+            }
@@ -0,0 +1,75 @@
+import aiohttp
+from dotenv import load_dotenv
+from typing import Any, Dict, Optional
+import os
+load_dotenv()
+class HTTPClient:
+    """One pooled aiohttp session for outbound calls, opened and closed by the app lifespan.
+
+    Reusing the session keeps connections alive between lookups, so only the first call to
+    a host pays for DNS, TCP and TLS setup. Code that runs outside the lifespan (commands,
+    benchmarks) gets a session on first use and should call close() when done.
+    """
+    session: Optional[aiohttp.ClientSession] = None
+
+    # Connection pool settings, see https://docs.aiohttp.org/en/stable/client_reference.html#tcpconnector
+    POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', '100'))
+    POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', '20'))
+    DNS_CACHE_TTL_SECONDS = int(os.getenv('HTTP_DNS_CACHE_TTL_SECONDS', '300'))
+    KEEPALIVE_TIMEOUT_SECONDS = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT_SECONDS', '30'))
+    CONNECT_TIMEOUT_SECONDS = float(os.getenv('HTTP_CONNECT_TIMEOUT_SECONDS', '3'))
+    READ_TIMEOUT_SECONDS = float(os.getenv('HTTP_READ_TIMEOUT_SECONDS', '5'))
+    TOTAL_TIMEOUT_SECONDS = float(os.getenv('HTTP_TOTAL_TIMEOUT_SECONDS', '10'))
+
+    @classmethod
+    def connector_options(cls) -> dict:
+        return {
+            'limit': cls.POOL_LIMIT,
+            'limit_per_host': cls.POOL_LIMIT_PER_HOST,
+            'ttl_dns_cache': cls.DNS_CACHE_TTL_SECONDS,
+            'keepalive_timeout': cls.KEEPALIVE_TIMEOUT_SECONDS,
+        }
+
+    @classmethod
+    def timeout(cls) -> aiohttp.ClientTimeout:
+        # total also covers waiting for a free connection when the pool is exhausted
+        return aiohttp.ClientTimeout(
+            total=cls.TOTAL_TIMEOUT_SECONDS,
+            sock_connect=cls.CONNECT_TIMEOUT_SECONDS,
+            sock_read=cls.READ_TIMEOUT_SECONDS,
+        )
+
+    @classmethod
+    def initialize(cls) -> aiohttp.ClientSession:
+        if cls.session is None or cls.session.closed:
+            cls.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**cls.connector_options()),
+                timeout=cls.timeout(),
+            )
+        return cls.session
+
+    @classmethod
+    def get_session(cls) -> aiohttp.ClientSession:
+        return cls.initialize()
+
+    @classmethod
+    async def close(cls):
+        if cls.session is not None and not cls.session.closed:
+            await cls.session.close()
+            print('🔒 HTTP client closed')
+        cls.session = None
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            'open': cls.session is not None and not cls.session.closed,
+            'settings': {
+                'pool_limit': cls.POOL_LIMIT,
+                'pool_limit_per_host': cls.POOL_LIMIT_PER_HOST,
+                'dns_cache_ttl_seconds': cls.DNS_CACHE_TTL_SECONDS,
+                'keepalive_timeout_seconds': cls.KEEPALIVE_TIMEOUT_SECONDS,
+                'connect_timeout_seconds': cls.CONNECT_TIMEOUT_SECONDS,
+                'read_timeout_seconds': cls.READ_TIMEOUT_SECONDS,
+                'total_timeout_seconds': cls.TOTAL_TIMEOUT_SECONDS,
+            }
+        }
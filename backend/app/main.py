@@ -11,7 +11,12 @@ from app.api.v1.routes.users.info.user_info import router as user_info_router
 from app.api.v1.routes.users.events.breach_events import router as breach_events_router
 from app.utils.logger.logger import Logger
 from app.core.db.db import get_db, MongoDB
+from app.core.http.client import HTTPClient
 from app.core.middleware import ErrorHandlingMiddleware
+from app.services.users.scoring.score_queue import RiskScoreQueue
+from app.services.users.info.enrichment_queue import DeviceEnrichmentQueue
+from app.services.users.events.event_bus import BreachEventBus
+from app.utils.cache.ttl_cache import TTLCache
 from app.utils.json_encoder import CustomJSONEncoder
 
 load_dotenv()
@@ -98,7 +103,6 @@ async def read_root():
 
 @app.get('/health')
 async def health_check():
-    from app.core.db import MongoDB
     if MongoDB.client:
         try:
             await MongoDB.client.admin.command('ping')
@@ -107,5 +111,33 @@ async def health_check():
             return {"status": "healthy", "mongodb": "error"}
     return {"status": "healthy", "mongodb": "not configured"}
 
+@app.get('/health/pool')
+async def pool_stats():
+    return {
+        "mongodb": "connected" if MongoDB.client else "not configured",
+        "settings": MongoDB.pool_options(),
+        "pool": MongoDB.pool_metrics.stats()
+    }
+
+@app.get('/health/score-queue')
+async def score_queue_stats():
+    return RiskScoreQueue.stats()
+
+@app.get('/health/enrichment-queue')
+async def enrichment_queue_stats():
+    return DeviceEnrichmentQueue.stats()
+
+@app.get('/health/event-stream')
+async def event_stream_stats():
+    return BreachEventBus.stats()
+
+@app.get('/health/http')
+async def http_client_stats():
+    return HTTPClient.stats()
+
+@app.get('/health/cache')
+async def cache_stats():
+    return TTLCache.all_stats()
+
 if __name__ == '__main__':
     uvicorn.run(app, host='0.0.0.0', port=8080)
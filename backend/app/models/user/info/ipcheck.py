@@ -15,4 +15,8 @@ class IPCheckResult(BaseModel):
     risk_score: float = 0.0
     country_code: str = ''
     city: Optional[str] = None
+    asn: Optional[int] = None
+    as_org: Optional[str] = None
     last_seen: Optional[datetime] = None
+    # None until the background enrichment has looked the IP up
+    enriched_at: Optional[datetime] = None
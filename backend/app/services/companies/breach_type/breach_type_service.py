@@ -2,13 +2,25 @@ from app.models.company.company import Company
 from app.models.company.breach_type.breach_type import CompanyBreachType, BreachTypeEnum
 from app.utils.logger.logger import Logger
 from app.core.db.db import MongoDB
-from typing import Optional, List
+from app.utils.cache.ttl_cache import TTLCache, MISSING
+from typing import Optional, List, Dict
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app.services.companies.company_service import CompanyService
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
 
 class CompanyBreachService:
     collection_name = "company_breaches"
 
+    # Breach configs are read for every ingested event. Companies without a config are
+    # cached too, since manual events for them would otherwise miss on every call.
+    CACHE_TTL_SECONDS = float(os.getenv('COMPANY_BREACH_CACHE_TTL_SECONDS', '60'))
+    CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv('COMPANY_BREACH_CACHE_NEGATIVE_TTL_SECONDS', '5'))
+    cache = TTLCache('company_breaches', CACHE_TTL_SECONDS, int(os.getenv('COMPANY_BREACH_CACHE_MAX_SIZE', '10000')))
+
     @classmethod
     async def create_breach_record(cls, company_id: str, breach: CompanyBreachType):
         try:
@@ -18,21 +30,13 @@ class CompanyBreachService:
                 Logger.error(f'Company {company_id} not found')
                 return None
 
-            # Check for existing breach
-            existing_breach = await cls.get_breach_by_company(company_id)
-            if existing_breach:
-                Logger.warning(f'Breach record already exists for company {company_id}')
-                return existing_breach
-
-            # Create new breach record
+            # Create the breach record unless the company already has one
             breach_dict = breach.model_dump()
-            breach_dict['company_id'] = company_id
-
-            result = await MongoDB.db[cls.collection_name].insert_one(breach_dict)
-
-            # Get created breach
-            created_breach = await MongoDB.db[cls.collection_name].find_one(
-                {'_id': result.inserted_id}
+            created_breach = await MongoDB.db[cls.collection_name].find_one_and_update(
+                {'company_id': company_id},
+                {'$setOnInsert': breach_dict},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
             )
             if not created_breach:
                 return None
@@ -41,29 +45,68 @@ class CompanyBreachService:
             if '_id' in created_breach:
                 created_breach['_id'] = str(created_breach['_id'])
 
-            return CompanyBreachType.model_validate(created_breach)
+            created = CompanyBreachType.model_validate(created_breach)
+            cls.cache.set(company_id, created)
+            return created
         except Exception as e:
             Logger.error(f'Error creating breach record: {str(e)}')
             return None
 
     @classmethod
     async def get_breach_by_company(cls, company_id: str) -> Optional[CompanyBreachType]:
+        cached = cls.cache.get(company_id)
+        if cached is not MISSING:
+            return cached
         try:
             breach = await MongoDB.db[cls.collection_name].find_one(
                 {'company_id': company_id}
             )
             if not breach:
+                cls.cache.set(company_id, None, cls.CACHE_NEGATIVE_TTL_SECONDS)
                 return None
 
             # Convert ObjectId to string
             if '_id' in breach:
                 breach['_id'] = str(breach['_id'])
 
-            return CompanyBreachType.model_validate(breach)
+            company_breach = CompanyBreachType.model_validate(breach)
+            cls.cache.set(company_id, company_breach)
+            return company_breach
         except Exception as e:
             Logger.error(f'Error getting breach record: {str(e)}')
             return None
 
+    @classmethod
+    async def get_breaches_by_companies(cls, company_ids: List[str]) -> Dict[str, CompanyBreachType]:
+        """Look up the breach records of many companies, keyed by company_id.
+
+        Cached companies are answered from the cache; the rest are fetched in one query.
+        """
+        try:
+            breaches = {}
+            missing = []
+            for company_id in set(company_ids):
+                cached = cls.cache.get(company_id)
+                if cached is MISSING:
+                    missing.append(company_id)
+                elif cached is not None:
+                    breaches[company_id] = cached
+            if not missing:
+                return breaches
+
+            cursor = MongoDB.db[cls.collection_name].find({'company_id': {'$in': missing}})
+            async for breach in cursor:
+                breaches[breach['company_id']] = CompanyBreachType.model_validate(breach)
+            for company_id in missing:
+                if company_id in breaches:
+                    cls.cache.set(company_id, breaches[company_id])
+                else:
+                    cls.cache.set(company_id, None, cls.CACHE_NEGATIVE_TTL_SECONDS)
+            return breaches
+        except Exception as e:
+            Logger.error(f'Error getting breach records: {str(e)}')
+            return {}
+
     @classmethod
     async def get_breach_type(cls, breach_type: str) -> Optional[CompanyBreachType]:
         try:
@@ -85,24 +128,26 @@ class CompanyBreachService:
                 Logger.error(f'Company {company_id} not found')
                 return None
 
-            # Check if breach exists
-            existing_breach = await cls.get_breach_by_company(company_id)
-            if not existing_breach:
-                Logger.error(f'No breach record found for company {company_id}')
-                return None
-
             # Update breach record
             breach_dict = breach.model_dump(exclude={'id'})
             breach_dict['company_id'] = company_id
 
-            result = await MongoDB.db[cls.collection_name].update_one(
+            updated_breach = await MongoDB.db[cls.collection_name].find_one_and_update(
                 {'company_id': company_id},
-                {'$set': breach_dict}
+                {'$set': breach_dict},
+                return_document=ReturnDocument.AFTER
             )
+            if not updated_breach:
+                Logger.error(f'No breach record found for company {company_id}')
+                cls.cache.invalidate(company_id)
+                return None
 
-            if result.modified_count > 0:
-                return await cls.get_breach_by_company(company_id)
-            return None
+            if '_id' in updated_breach:
+                updated_breach['_id'] = str(updated_breach['_id'])
+
+            updated = CompanyBreachType.model_validate(updated_breach)
+            cls.cache.set(company_id, updated)
+            return updated
         except Exception as e:
             Logger.error(f'Error updating breach record: {str(e)}')
             return None
@@ -137,6 +182,7 @@ class CompanyBreachService:
             result = await MongoDB.db[cls.collection_name].delete_one(
                 {'company_id': company_id}
             )
+            cls.cache.invalidate(company_id)
             return result.deleted_count > 0
         except Exception as e:
             Logger.error(f'Error deleting breach record: {str(e)}')
@@ -152,18 +198,3 @@ class CompanyBreachService:
         except Exception as e:
             Logger.error(f'Error getting companies by breach type: {str(e)}')
             return []
-
-    @classmethod
-    async def get_high_impact_breaches(cls, effect_threshold: int = 70) -> List[dict]:
-        try:
-            breaches = await MongoDB.db[cls.collection_name].find(
-                {'effect': {'$gte': effect_threshold}}
-            ).to_list(length=None)
-            for breach in breaches:
-                breach['_id'] = str(breach['_id'])
-                breach['company_id'] = str(breach['company_id'])
-
-            return breaches
-        except Exception as e:
-            Logger.error(f'Error getting high impact breaches: {str(e)}')
-            return []
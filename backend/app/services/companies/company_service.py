@@ -1,12 +1,24 @@
 from app.models.company.company import Company
 from app.utils.logger.logger import Logger
 from app.core.db.db import MongoDB
+from app.utils.cache.ttl_cache import TTLCache, MISSING
 from typing import Optional
 from bson import ObjectId
+from pymongo import ReturnDocument
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
 
 class CompanyService:
     collection_name = "companies"
 
+    # Companies change rarely but are read on every breach-type request. Writes made by
+    # this process invalidate immediately; the TTL bounds staleness from other workers.
+    CACHE_TTL_SECONDS = float(os.getenv('COMPANY_CACHE_TTL_SECONDS', '60'))
+    CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv('COMPANY_CACHE_NEGATIVE_TTL_SECONDS', '5'))
+    cache = TTLCache('companies', CACHE_TTL_SECONDS, int(os.getenv('COMPANY_CACHE_MAX_SIZE', '10000')))
+
     @classmethod
     async def check_if_record_exists(cls, company_id: str) -> bool:
         try:
@@ -19,18 +31,13 @@ class CompanyService:
     @classmethod
     async def create_company(cls, company: Company):
         try:
-            # Check if company already exists
-            existing_company = await cls.get_company(company.id)
-            if existing_company:
-                return existing_company
-
-            # Create new company
-            company_dict = company.model_dump()
-            result = await MongoDB.db[cls.collection_name].insert_one(company_dict)
-            
-            # Get created company
-            created_company = await MongoDB.db[cls.collection_name].find_one(
-                {'_id': result.inserted_id}
+            # Returns the existing company if one is already registered under this id
+            company_dict = company.model_dump(exclude={'id'})
+            created_company = await MongoDB.db[cls.collection_name].find_one_and_update(
+                {'id': company.id},
+                {'$setOnInsert': company_dict},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
             )
             if not created_company:
                 return None
@@ -39,25 +46,33 @@ class CompanyService:
             if '_id' in created_company:
                 created_company['_id'] = str(created_company['_id'])
 
-            return Company.model_validate(created_company)
+            created = Company.model_validate(created_company)
+            cls.cache.set(company.id, created)
+            return created
         except Exception as e:
             Logger.error(f'Error creating company: {str(e)}')
             return None
 
     @classmethod
     async def get_company(cls, company_id: str):
+        cached = cls.cache.get(company_id)
+        if cached is not MISSING:
+            return cached
         try:
             company_data = await MongoDB.db[cls.collection_name].find_one(
                 {'id': company_id}
             )
             if not company_data:
+                cls.cache.set(company_id, None, cls.CACHE_NEGATIVE_TTL_SECONDS)
                 return None
 
             # Convert ObjectId to string
             if '_id' in company_data:
                 company_data['_id'] = str(company_data['_id'])
 
-            return Company.model_validate(company_data)
+            company = Company.model_validate(company_data)
+            cls.cache.set(company_id, company)
+            return company
         except Exception as e:
             Logger.error(f'Error getting company: {str(e)}')
             return None
@@ -68,6 +83,7 @@ class CompanyService:
             result = await MongoDB.db[cls.collection_name].delete_one(
                 {'id': company_id}
             )
+            cls.cache.invalidate(company_id)
             return result.deleted_count > 0
         except Exception as e:
             Logger.error(f'Error deleting company: {str(e)}')
@@ -77,13 +93,21 @@ class CompanyService:
     async def update_company(cls, company: Company):
         try:
             company_dict = company.model_dump(exclude={'_id'})
-            result = await MongoDB.db[cls.collection_name].update_one(
+            updated_company = await MongoDB.db[cls.collection_name].find_one_and_update(
                 {'id': company.id},
-                {'$set': company_dict}
+                {'$set': company_dict},
+                return_document=ReturnDocument.AFTER
             )
-            if result.modified_count > 0:
-                return await cls.get_company(company.id)
-            return None
+            if not updated_company:
+                cls.cache.invalidate(company.id)
+                return None
+
+            if '_id' in updated_company:
+                updated_company['_id'] = str(updated_company['_id'])
+
+            updated = Company.model_validate(updated_company)
+            cls.cache.set(company.id, updated)
+            return updated
         except Exception as e:
             Logger.error(f'Error updating company: {str(e)}')
             return None
@@ -1,34 +1,150 @@
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+import asyncio
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple, Union
+from datetime import datetime, timedelta
 from bson import ObjectId
+from pydantic import ValidationError
+from pymongo import ReturnDocument, DESCENDING
+from pymongo.errors import BulkWriteError
 from app.core.db.db import MongoDB
+from app.core.db.indexes import plan_summary
 from app.models.user.events.event import BreachEvent
 from app.utils.logger.logger import Logger
+from app.utils.pagination import keyset_filter, keyset_sort, merge_pages, next_cursor
+from app.services.users.scoring.score_queue import RiskScoreQueue
+from app.services.users.events.event_bus import BreachEventBus
 from app.services.companies.breach_type.breach_type_service import CompanyBreachService
-from app.models.company.breach_type.breach_type import BreachTypeEnum
+from app.models.company.breach_type.breach_type import BreachTypeEnum, CompanyBreachType
 
 class BreachEventService:
     collection_name = "breach_events"
+    # Events CLOSED for a while are moved here by archive_closed_events, keeping their _id
+    archive_collection_name = "breach_events_archive"
 
     @classmethod
-    async def get_all_breach_events(cls) -> List[Dict[str, Any]]:
-        try:
-            Logger.info(f"Getting all breach events from collection: {cls.collection_name}")
-            events = await MongoDB.db[cls.collection_name].find().sort('timestamp', -1).to_list(None)
-            Logger.info(f"Found {len(events) if events else 0} events in database")
-            if not events:
-                Logger.info("No events found in database")
-                return []
+    def _collections(cls, include_archived: bool = False) -> List[str]:
+        if include_archived:
+            return [cls.collection_name, cls.archive_collection_name]
+        return [cls.collection_name]
+
+    @classmethod
+    async def _find_page(cls, query: Dict[str, Any], limit: Optional[int] = None,
+                         cursor: Optional[str] = None, direction: int = DESCENDING,
+                         include_archived: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Fetch one page of events in (timestamp, _id) order, newest first by default.
+
+        Only limit + 1 documents are pulled from the server; the extra one tells us whether
+        another page exists. A limit of None returns every match (internal callers only).
+        With include_archived the archive is queried alongside and the two pages are merged.
+        """
+        async def fetch(collection_name):
+            find = MongoDB.db[collection_name].find(keyset_filter(query, cursor, direction)).sort(keyset_sort(direction))
+            if limit is not None:
+                find = find.limit(limit + 1)
+            return await find.to_list(None)
+
+        pages = await asyncio.gather(*(fetch(name) for name in cls._collections(include_archived)))
+        page = merge_pages(pages, direction, None if limit is None else limit + 1)
+        events = [BreachEvent.model_validate(event).model_dump(by_alias=True) for event in page]
+        return next_cursor(events, limit)
+
+    @staticmethod
+    def _user_id_filter(user_id: str) -> Dict[str, Any]:
+        # Older events reference the user by ObjectId rather than passport string
+        if ObjectId.is_valid(user_id):
+            return {'user_id': {'$in': [user_id, ObjectId(user_id)]}}
+        return {'user_id': user_id}
+
+    @staticmethod
+    def _one_of(values: Union[str, List[str]]) -> Any:
+        if isinstance(values, (list, tuple, set)):
+            values = list(dict.fromkeys(values))
+            return values[0] if len(values) == 1 else {'$in': values}
+        return values
 
+    @classmethod
+    def build_filter(cls, user_id: Optional[str] = None, company_id: Optional[str] = None,
+                     status: Union[str, List[str], None] = None, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None, severity: Union[str, List[str], None] = None,
+                     breach_type: Union[str, List[str], None] = None) -> Dict[str, Any]:
+        """Build an events query. status, severity and breach_type accept one value or a list of alternatives."""
+        query = cls._user_id_filter(user_id) if user_id else {}
+        if company_id:
+            query['company_id'] = company_id
+        if status:
+            query['status'] = cls._one_of(status)
+        if severity:
+            query['severity'] = cls._one_of(severity)
+        if breach_type:
+            query['breach_type'] = cls._one_of(breach_type)
+        if start or end:
+            query['timestamp'] = {}
+            if start:
+                query['timestamp']['$gte'] = start
+            if end:
+                query['timestamp']['$lt'] = end
+        return query
+
+    @classmethod
+    async def iter_breach_events(cls, query: Dict[str, Any], batch_size: int = 500,
+                                 include_archived: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """Yield matching events newest first, holding at most one server batch per collection in memory."""
+        cursors = [
+            MongoDB.db[name].find(query).sort(keyset_sort()).batch_size(batch_size).__aiter__()
+            for name in cls._collections(include_archived)
+        ]
+        # Merge the already sorted streams by always taking the newest head
+        heads = {}
+        for index, cursor in enumerate(cursors):
+            try:
+                heads[index] = await cursor.__anext__()
+            except StopAsyncIteration:
+                pass
+        while heads:
+            index = max(heads, key=lambda i: (heads[i]['timestamp'], heads[i]['_id']))
+            yield BreachEvent.model_validate(heads[index]).model_dump(by_alias=True)
+            try:
+                heads[index] = await cursors[index].__anext__()
+            except StopAsyncIteration:
+                del heads[index]
 
-            for event in events:
-                Logger.info(f"Event found: {event}")
+    @classmethod
+    async def search_breach_events(cls, query: Dict[str, Any], direction: int = DESCENDING,
+                                   limit: Optional[int] = None, cursor: Optional[str] = None,
+                                   explain: bool = False, include_archived: bool = False) -> Dict[str, Any]:
+        """Run a build_filter() query and return one page, plus the hot collection's query plan when explain is set."""
+        events, next_page = await cls._find_page(query, limit, cursor, direction, include_archived)
+        result = {'events': events, 'next_cursor': next_page}
+        if explain:
+            find = MongoDB.db[cls.collection_name].find(keyset_filter(query, cursor, direction)).sort(keyset_sort(direction))
+            if limit is not None:
+                find = find.limit(limit + 1)
+            result['explain'] = plan_summary(await find.explain())
+        return result
 
-            return [BreachEvent.model_validate(event).model_dump(by_alias=True) for event in events]
+    @classmethod
+    async def get_all_breach_events(cls, limit: Optional[int] = None, cursor: Optional[str] = None,
+                                    include_archived: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        try:
+            events, next_page = await cls._find_page({}, limit, cursor, include_archived=include_archived)
+            Logger.info(f"Found {len(events)} events in {cls.collection_name}")
+            return events, next_page
         except Exception as e:
             Logger.error(f"Error getting all events: {str(e)}")
             raise e
 
+    @staticmethod
+    def _effect_score(event_dict: Dict[str, Any], company_breach: Optional[CompanyBreachType]) -> int:
+        if company_breach:
+            if company_breach.breach_type != event_dict.get('breach_type'):
+                Logger.warning(
+                    f"Event breach type {event_dict.get('breach_type')} doesn't match company breach type "
+                    f"{company_breach.breach_type}. Using default score."
+                )
+                return BreachTypeEnum.get_default_effect_score(event_dict.get('breach_type'))
+            return company_breach.effect_score
+        Logger.info(f"No breach record found for company {event_dict.get('company_id')}. Using default score.")
+        return BreachTypeEnum.get_default_effect_score(event_dict.get('breach_type'))
+
     @classmethod
     async def create_breach_event(cls, event):
         from app.services.users.user_service import UserService
@@ -38,31 +154,16 @@ class BreachEventService:
             else:
                 event_dict = event.copy()
             if event_dict.get('manual_entry'):
-                result = await MongoDB.db[cls.collection_name].insert_one(event_dict)
+                await MongoDB.db[cls.collection_name].insert_one(event_dict)
             else:
                 company_breach = await CompanyBreachService.get_breach_by_company(event_dict.get('company_id'))
-                if company_breach:
-                    if company_breach.breach_type != event_dict.get('breach_type'):
-                        Logger.warning(
-                            f"Event breach type {event_dict.get('breach_type')} doesn't match company breach type "
-                            f"{company_breach.breach_type}. Using default score."
-                        )
-                        event_dict['effect_score'] = BreachTypeEnum.get_default_effect_score(event_dict.get('breach_type'))
-                    else:
-                        event_dict['effect_score'] = company_breach.effect_score
-                else:
-                    Logger.info(f"No breach record found for company {event_dict.get('company_id')}. Using default score.")
-                    event_dict['effect_score'] = BreachTypeEnum.get_default_effect_score(event_dict.get('breach_type'))
-                result = await MongoDB.db[cls.collection_name].insert_one(event_dict)
-            created_event = await MongoDB.db[cls.collection_name].find_one({'_id': result.inserted_id})
-            if not created_event:
-                Logger.error("Failed to find created event")
-                return None
-            breach_event = BreachEvent.model_validate(created_event).model_dump(by_alias=True)
+                event_dict['effect_score'] = cls._effect_score(event_dict, company_breach)
+                await MongoDB.db[cls.collection_name].insert_one(event_dict)
+            # insert_one sets event_dict['_id'], so the stored document is already in hand
+            breach_event = BreachEvent.model_validate(event_dict).model_dump(by_alias=True)
             if breach_event.get('user_id'):
-                Logger.info(f"Updating ref score for user {breach_event['user_id']}")
-                updated_score = await UserService.set_user_risk_score(breach_event['user_id'])
-                Logger.info(f"Updated ref score to {updated_score} for user {breach_event['user_id']}")
+                await RiskScoreQueue.submit(breach_event['user_id'], UserService.event_risk_delta(event_dict))
+            BreachEventBus.publish('created', breach_event)
 
             return breach_event
 
@@ -71,11 +172,70 @@ class BreachEventService:
             raise e
 
     @classmethod
-    async def get_breach_event(cls, event_id: str) -> Optional[Dict[str, Any]]:
+    async def create_breach_events_bulk(cls, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Validate and insert many events at once and queue one score update per affected user.
+
+        Items that fail validation or insertion are reported by their position in the
+        request and do not stop the rest of the batch.
+        """
+        from app.services.users.user_service import UserService
+
+        results: List[Dict[str, Any]] = [None] * len(events)
+        docs, positions = [], []
+        for index, raw_event in enumerate(events):
+            try:
+                event = BreachEvent.model_validate(raw_event)
+            except ValidationError as e:
+                results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+                continue
+            docs.append(event.model_dump(exclude={'id'}))
+            positions.append(index)
+
+        # One lookup per distinct company instead of one per event
+        company_ids = {doc['company_id'] for doc in docs if doc.get('company_id')}
+        company_breaches = await CompanyBreachService.get_breaches_by_companies(company_ids) if company_ids else {}
+        for doc in docs:
+            doc['effect_score'] = cls._effect_score(doc, company_breaches.get(doc.get('company_id')))
+
+        failed_docs = set()
+        if docs:
+            try:
+                await MongoDB.db[cls.collection_name].insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get('writeErrors', []):
+                    failed_docs.add(write_error['index'])
+                    index = positions[write_error['index']]
+                    results[index] = {'index': index, 'status': 'error', 'error': write_error.get('errmsg')}
+
+        deltas: Dict[str, Dict[str, float]] = {}
+        for doc_index, (index, doc) in enumerate(zip(positions, docs)):
+            if doc_index in failed_docs:
+                continue
+            results[index] = {'index': index, 'status': 'created', '_id': str(doc['_id'])}
+            deltas[doc['user_id']] = UserService.merge_risk_deltas(
+                deltas.get(doc['user_id'], {}), UserService.event_risk_delta(doc)
+            )
+            if BreachEventBus.has_subscribers():
+                BreachEventBus.publish('created', BreachEvent.model_validate(doc).model_dump(by_alias=True))
+
+        await RiskScoreQueue.submit_many(deltas)
+        created = len(docs) - len(failed_docs)
+        Logger.info(f"Bulk ingest: {created} created, {len(events) - created} failed, {len(deltas)} users rescored")
+        return {
+            'created': created,
+            'failed': len(events) - created,
+            'results': results,
+            'users_rescored': len(deltas)
+        }
+
+    @classmethod
+    async def get_breach_event(cls, event_id: str, include_archived: bool = False) -> Optional[Dict[str, Any]]:
         try:
             event = await MongoDB.db[cls.collection_name].find_one(
                 {'_id': ObjectId(event_id)}
             )
+            if not event and include_archived:
+                event = await MongoDB.db[cls.archive_collection_name].find_one({'_id': ObjectId(event_id)})
             if not event:
                 return None
             return BreachEvent.model_validate(event).model_dump(by_alias=True)
@@ -84,39 +244,21 @@ class BreachEventService:
             raise e
 
     @classmethod
-    async def get_user_breach_events(cls, user_id: str) -> List[Dict[str, Any]]:
+    async def get_user_breach_events(cls, user_id: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                                     include_archived: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
         try:
-            # Try to find events by user_id
-            events = await MongoDB.db[cls.collection_name].find(
-                {'user_id': user_id}
-            ).sort('timestamp', -1).to_list(None)
-
-            if not events:
-                # If no events found, try to find by ObjectId
-                try:
-                    events = await MongoDB.db[cls.collection_name].find(
-                        {'user_id': ObjectId(user_id)}
-                    ).sort('timestamp', -1).to_list(None)
-                except:
-                    pass
-
-            if not events:
-                return []
-
-            return [BreachEvent.model_validate(event).model_dump(by_alias=True) for event in events]
+            return await cls._find_page(cls._user_id_filter(user_id), limit, cursor, include_archived=include_archived)
+        except ValueError:
+            raise
         except Exception as e:
             Logger.error(f"Error getting user breach events: {str(e)}")
-            return []  # Return empty list instead of raising
+            return [], None  # Return empty page instead of raising
 
     @classmethod
-    async def get_company_breach_events(cls, company_id: str) -> List[Dict[str, Any]]:
+    async def get_company_breach_events(cls, company_id: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                                        include_archived: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
         try:
-            events = await MongoDB.db[cls.collection_name].find(
-                {'company_id': company_id}
-            ).sort('timestamp', -1).to_list(None)
-            if not events:
-                return []
-            return [BreachEvent.model_validate(event).model_dump(by_alias=True) for event in events]
+            return await cls._find_page({'company_id': company_id}, limit, cursor, include_archived=include_archived)
         except Exception as e:
             Logger.error(f"Error getting company breach events: {str(e)}")
             raise e
@@ -124,29 +266,54 @@ class BreachEventService:
     @classmethod
     async def update_breach_event(cls, event_id: str, event: BreachEvent) -> Optional[Dict[str, Any]]:
         try:
-            existing_event = await cls.get_breach_event(event_id)
-            if not existing_event:
-                return None
             event_dict = event.model_dump(exclude={'id'})
-            result = await MongoDB.db[cls.collection_name].update_one(
+            # The pre-image tells us which score contribution to take back
+            previous_event = await MongoDB.db[cls.collection_name].find_one_and_update(
                 {'_id': ObjectId(event_id)},
-                {'$set': event_dict}
+                {'$set': event_dict},
+                return_document=ReturnDocument.BEFORE
             )
+            if not previous_event:
+                return None
 
-            if result.modified_count > 0:
-                return await cls.get_breach_event(event_id)
-            return None
+            updated_event = {**previous_event, **event_dict}
+            scored_fields = ('user_id', 'severity', 'breach_type', 'timestamp')
+            if any(previous_event.get(field) != updated_event.get(field) for field in scored_fields):
+                await cls._move_risk_contribution(previous_event, updated_event)
+            breach_event = BreachEvent.model_validate(updated_event).model_dump(by_alias=True)
+            BreachEventBus.publish('updated', breach_event, previous_status=previous_event.get('status'))
+            return breach_event
         except Exception as e:
             Logger.error(f"Error updating breach event: {str(e)}")
             return None
 
+    @staticmethod
+    async def _move_risk_contribution(previous_event: Dict[str, Any], updated_event: Dict[str, Any]):
+        from app.services.users.user_service import UserService
+        removed = UserService.event_risk_delta(previous_event, sign=-1)
+        added = UserService.event_risk_delta(updated_event)
+        if previous_event.get('user_id') == updated_event['user_id']:
+            await RiskScoreQueue.submit(updated_event['user_id'], UserService.merge_risk_deltas(removed, added))
+            return
+        if previous_event.get('user_id'):
+            await RiskScoreQueue.submit(str(previous_event['user_id']), removed)
+        await RiskScoreQueue.submit(updated_event['user_id'], added)
+
     @classmethod
     async def delete_breach_event(cls, event_id: str) -> bool:
+        from app.services.users.user_service import UserService
         try:
-            result = await MongoDB.db[cls.collection_name].delete_one(
+            deleted_event = await MongoDB.db[cls.collection_name].find_one_and_delete(
                 {'_id': ObjectId(event_id)}
             )
-            return result.deleted_count > 0
+            if not deleted_event:
+                return False
+            if deleted_event.get('user_id'):
+                await RiskScoreQueue.submit(
+                    str(deleted_event['user_id']), UserService.event_risk_delta(deleted_event, sign=-1)
+                )
+            BreachEventBus.publish('deleted', BreachEvent.model_validate(deleted_event).model_dump(by_alias=True))
+            return True
         except Exception as e:
             Logger.error(f"Error deleting breach event: {str(e)}")
             return False
@@ -165,33 +332,132 @@ class BreachEventService:
         }
 
         try:
-            await MongoDB.db[cls.collection_name].update_one({'_id': oid}, {'$set': update})
-            event = await MongoDB.db[cls.collection_name].find_one({'_id': oid})
-            if event:
-                event['_id'] = str(event['_id'])
+            # The pre-image carries the old status for stream subscribers filtering on it
+            previous_event = await MongoDB.db[cls.collection_name].find_one_and_update(
+                {'_id': oid},
+                {'$set': update},
+                return_document=ReturnDocument.BEFORE
+            )
+            if not previous_event:
+                return None
+            event = {**previous_event, **update}
+            event['_id'] = str(event['_id'])
+            BreachEventBus.publish('resolved', event, previous_status=previous_event.get('status'))
             return event
         except:
             return None
 
     @classmethod
-    async def get_unresolved_events(cls) -> List[Dict[str, Any]]:
-        try:
-            Logger.info("Getting unresolved breach events")
-            query = {'status': {'$ne': 'CLOSED'}}
-            Logger.info(f"Query: {query}")
+    async def set_status_bulk(cls, status: str, resolution_notes: str = '',
+                              event_ids: Optional[List[str]] = None,
+                              query: Optional[Dict[str, Any]] = None,
+                              max_events: Optional[int] = None) -> Dict[str, Any]:
+        """Move many events to status in one update_many and report the outcome per id.
 
-            events = await MongoDB.db[cls.collection_name].find(query).sort('timestamp', -1).to_list(None)
-            Logger.info(f"Found {len(events) if events else 0} unresolved events")
+        Events are selected either by id or by a build_filter() query; a query matching more
+        than max_events raises ValueError before anything is written. Closing an event stamps
+        its resolution time, any other status clears it. Scores do not depend on status, so
+        no rescoring is queued; the affected users are only counted.
+        """
+        outcomes: Dict[str, str] = {}
+        if event_ids is not None:
+            object_ids = []
+            for event_id in dict.fromkeys(event_ids):
+                if ObjectId.is_valid(event_id):
+                    object_ids.append(ObjectId(event_id))
+                    outcomes[event_id] = 'not_found'
+                else:
+                    outcomes[event_id] = 'invalid_id'
+            selector = {'_id': {'$in': object_ids}}
+        else:
+            selector = query
 
-            if not events:
-                Logger.info("No unresolved events found")
-                return []
+        # The pre-images give per-id outcomes, the affected users and the previous status for subscribers
+        projection = None if BreachEventBus.has_subscribers() else {'user_id': 1, 'status': 1}
+        find = MongoDB.db[cls.collection_name].find(selector, projection)
+        if max_events is not None and event_ids is None:
+            find = find.limit(max_events + 1)
+        previous_events = await find.to_list(None)
+        if max_events is not None and len(previous_events) > max_events:
+            raise ValueError(f'Filter matches more than {max_events} events, narrow it down')
 
-            # Log each unresolved event for debugging
-            for event in events:
-                Logger.info(f"Unresolved event found: {event}")
+        update = {
+            'status': status,
+            'resolution_notes': resolution_notes,
+            'resolution_timestamp': datetime.now() if status == 'CLOSED' else None
+        }
+        matched_ids = [event['_id'] for event in previous_events]
+        modified = 0
+        if matched_ids:
+            # Update by _id rather than re-running the filter, so events written in between are untouched
+            result = await MongoDB.db[cls.collection_name].update_many({'_id': {'$in': matched_ids}}, {'$set': update})
+            modified = result.modified_count
+
+        users = set()
+        for previous_event in previous_events:
+            outcomes[str(previous_event['_id'])] = 'updated'
+            if previous_event.get('user_id'):
+                users.add(str(previous_event['user_id']))
+            if projection is None:
+                event = {**previous_event, **update}
+                event['_id'] = str(event['_id'])
+                BreachEventBus.publish('resolved' if status == 'CLOSED' else 'updated', event,
+                                       previous_status=previous_event.get('status'))
 
-            return [BreachEvent.model_validate(event).model_dump(by_alias=True) for event in events]
+        Logger.info(f"Bulk status change to {status}: {len(matched_ids)} matched, {modified} modified")
+        return {
+            'matched': len(matched_ids),
+            'modified': modified,
+            'users_affected': len(users),
+            'results': [{'_id': event_id, 'status': outcome} for event_id, outcome in outcomes.items()]
+        }
+
+    @classmethod
+    async def get_unresolved_events(cls, limit: Optional[int] = None,
+                                    cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        try:
+            events, next_page = await cls._find_page({'status': {'$ne': 'CLOSED'}}, limit, cursor)
+            Logger.info(f"Found {len(events)} unresolved events")
+            return events, next_page
         except Exception as e:
             Logger.error(f"Error getting unresolved events: {str(e)}")
             raise e
+
+    @classmethod
+    async def archive_closed_events(cls, older_than_days: int, batch_size: int = 1000) -> Dict[str, Any]:
+        """Move events CLOSED more than older_than_days ago into the archive collection, batch by batch.
+
+        Each batch is copied first and only then deleted from the hot collection, so an
+        interrupted run leaves events in both places at worst; the next run skips the
+        duplicate copies and finishes the move. Archived events keep counting towards their
+        user's risk_stats, which are not touched here.
+        """
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        query = {'status': 'CLOSED', 'resolution_timestamp': {'$lt': cutoff}}
+        hot = MongoDB.db[cls.collection_name]
+        archive = MongoDB.db[cls.archive_collection_name]
+        archived = batches = 0
+
+        while True:
+            events = await hot.find(query).sort('resolution_timestamp', 1).limit(batch_size).to_list(None)
+            if not events:
+                break
+            ids = [event['_id'] for event in events]
+            try:
+                await archive.insert_many(events, ordered=False)
+            except BulkWriteError as e:
+                # Copies left over from an interrupted run are fine, anything else stops the job
+                if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                    raise
+
+            # Re-check the criteria so an event reopened since the copy stays hot
+            deleted = await hot.delete_many({**query, '_id': {'$in': ids}})
+            if deleted.deleted_count < len(ids):
+                still_hot = await hot.distinct('_id', {'_id': {'$in': ids}})
+                await archive.delete_many({'_id': {'$in': still_hot}})
+            archived += deleted.deleted_count
+            batches += 1
+            Logger.info(f"Archived batch {batches}: {deleted.deleted_count} events")
+
+        Logger.info(f"Archived {archived} events closed before {cutoff.isoformat()}")
+        return {'archived': archived, 'batches': batches, 'cutoff': cutoff}
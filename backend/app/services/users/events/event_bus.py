@@ -0,0 +1,94 @@
+import asyncio
+import os
+from typing import Any, Dict, Optional, Set
+from dotenv import load_dotenv
+from app.utils.logger.logger import Logger
+
+load_dotenv()
+
+
+class Subscription:
+    """One listener on the bus. Messages that do not fit in its queue are dropped and counted."""
+
+    def __init__(self, status: Optional[str], company_id: Optional[str], max_queue: int):
+        self.status = status
+        self.company_id = company_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.closed = False
+
+    def matches(self, event: Dict[str, Any], previous_status: Optional[str] = None) -> bool:
+        if self.company_id and event.get('company_id') != self.company_id:
+            return False
+        # An event moving out of the watched status is still news to that subscriber
+        if self.status and self.status not in (event.get('status'), previous_status):
+            return False
+        return True
+
+
+class BreachEventBus:
+    """In-process fan-out of breach event writes to live subscribers such as dashboard streams.
+
+    Publishing never waits: a subscriber that falls behind loses messages rather than
+    slowing down writes, and its dropped count tells it to refetch. Only writes made by
+    this process are seen, so with several workers each stream covers its own worker.
+    """
+    MAX_QUEUE = int(os.getenv('BREACH_EVENT_STREAM_MAX_QUEUE', '1000'))
+
+    _subscribers: Set[Subscription] = set()
+
+    published = 0
+    delivered = 0
+    dropped = 0
+
+    @classmethod
+    def subscribe(cls, status: Optional[str] = None, company_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(status, company_id, cls.MAX_QUEUE)
+        cls._subscribers.add(subscription)
+        return subscription
+
+    @classmethod
+    def unsubscribe(cls, subscription: Subscription):
+        cls._subscribers.discard(subscription)
+
+    @classmethod
+    def has_subscribers(cls) -> bool:
+        return bool(cls._subscribers)
+
+    @classmethod
+    def publish(cls, kind: str, event: Dict[str, Any], previous_status: Optional[str] = None):
+        cls.published += 1
+        message = {'type': kind, 'event': event}
+        for subscription in cls._subscribers:
+            if subscription.closed or not subscription.matches(event, previous_status):
+                continue
+            try:
+                subscription.queue.put_nowait(message)
+                cls.delivered += 1
+            except asyncio.QueueFull:
+                subscription.dropped += 1
+                cls.dropped += 1
+
+    @classmethod
+    def close(cls):
+        """Wake every subscriber with an end-of-stream marker. Called on shutdown."""
+        for subscription in cls._subscribers:
+            subscription.closed = True
+            try:
+                subscription.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                # Make room for the marker; the subscriber is ending anyway
+                subscription.queue.get_nowait()
+                subscription.queue.put_nowait(None)
+        if cls._subscribers:
+            Logger.info(f'Closed {len(cls._subscribers)} breach event subscriptions')
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            'subscribers': len(cls._subscribers),
+            'published': cls.published,
+            'delivered': cls.delivered,
+            'dropped': cls.dropped,
+            'max_queue': cls.MAX_QUEUE
+        }
@@ -0,0 +1,165 @@
+import asyncio
+import ipaddress
+import os
+from typing import Any, Dict, List, Optional, Set
+from dotenv import load_dotenv
+from app.services.users.info.ip_reputation import IPReputationStore
+from app.utils.logger.logger import Logger
+
+load_dotenv()
+
+
+class DeviceEnrichmentQueue:
+    """Background workers that look up IP reputation for recorded devices.
+
+    Work is keyed by IP, so an IP that is already queued, in flight or waiting for a retry is
+    not queued again. WORKERS bounds concurrent lookups. The queue holds at most MAX_QUEUE
+    IPs, and when it is full new IPs are rejected rather than slowing down requests. Failed
+    lookups are retried up to MAX_ATTEMPTS times with a doubling delay. Devices that are never
+    enriched keep enriched_at unset and are queued again the next time they are seen. Values
+    that are not IP addresses can never be enriched and are dropped without a lookup.
+    """
+    WORKERS = int(os.getenv('ENRICHMENT_WORKERS', '8'))
+    MAX_QUEUE = int(os.getenv('ENRICHMENT_MAX_QUEUE', '10000'))
+    MAX_ATTEMPTS = int(os.getenv('ENRICHMENT_MAX_ATTEMPTS', '3'))
+    # Failed lookups stay in the IP cache for IP_CHECK_CACHE_ERROR_TTL_SECONDS, so a shorter
+    # first delay would only read the cached failure back
+    RETRY_DELAY_SECONDS = float(os.getenv('ENRICHMENT_RETRY_DELAY_SECONDS', '60'))
+    DRAIN_TIMEOUT_SECONDS = float(os.getenv('ENRICHMENT_DRAIN_TIMEOUT_SECONDS', '10'))
+    # Devices enriched longer ago than this are queued again when seen. Defaults to how long a
+    # stored reputation stays valid, since an earlier lookup would only read the same one back
+    REFRESH_SECONDS = int(os.getenv('ENRICHMENT_REFRESH_SECONDS', str(IPReputationStore.TTL_SECONDS)))
+
+    _queue: Optional[asyncio.Queue] = None
+    _workers: List[asyncio.Task] = []
+    _tracked: Set[str] = set()
+    _retries: Dict[str, asyncio.TimerHandle] = {}
+    _stopping = False
+
+    submitted = 0
+    deduplicated = 0
+    rejected = 0
+    invalid = 0
+    enriched = 0
+    retried = 0
+    failed = 0
+
+    @classmethod
+    def is_running(cls) -> bool:
+        return bool(cls._workers) and not cls._stopping
+
+    @classmethod
+    def start(cls):
+        if cls.is_running():
+            return
+        cls._queue = asyncio.Queue(maxsize=cls.MAX_QUEUE)
+        cls._stopping = False
+        cls._workers = [asyncio.create_task(cls._work()) for _ in range(cls.WORKERS)]
+        Logger.info(f'Device enrichment queue started with {cls.WORKERS} workers')
+
+    @classmethod
+    async def submit(cls, ip_address: str) -> bool:
+        """Queue an IP for enrichment. Enriches inline when the workers are not running.
+
+        Returns False when the IP was not enriched or queued.
+        """
+        from app.services.users.info.user_info import UserInfoService
+
+        try:
+            ipaddress.ip_address(ip_address)
+        except ValueError:
+            cls.invalid += 1
+            Logger.warning(f'Not enriching {ip_address!r}: not a valid IP address')
+            return False
+        if not cls.is_running():
+            return await UserInfoService.enrich_ip(ip_address)
+
+        cls.submitted += 1
+        if ip_address in cls._tracked:
+            cls.deduplicated += 1
+            return True
+        if not cls._put(ip_address, 1):
+            return False
+        cls._tracked.add(ip_address)
+        return True
+
+    @classmethod
+    def _put(cls, ip_address: str, attempt: int) -> bool:
+        try:
+            cls._queue.put_nowait((ip_address, attempt))
+            return True
+        except asyncio.QueueFull:
+            cls.rejected += 1
+            Logger.warning(f'Enrichment queue full, skipping IP {ip_address} until it is seen again')
+            return False
+
+    @classmethod
+    async def _work(cls):
+        from app.services.users.info.user_info import UserInfoService
+
+        while True:
+            ip_address, attempt = await cls._queue.get()
+            try:
+                if await UserInfoService.enrich_ip(ip_address):
+                    cls.enriched += 1
+                    cls._tracked.discard(ip_address)
+                elif attempt < cls.MAX_ATTEMPTS and not cls._stopping:
+                    cls.retried += 1
+                    delay = cls.RETRY_DELAY_SECONDS * 2 ** (attempt - 1)
+                    cls._retries[ip_address] = asyncio.get_running_loop().call_later(
+                        delay, cls._retry, ip_address, attempt + 1
+                    )
+                else:
+                    cls.failed += 1
+                    cls._tracked.discard(ip_address)
+                    Logger.error(f'Giving up enriching IP {ip_address} after {attempt} attempts')
+            finally:
+                cls._queue.task_done()
+
+    @classmethod
+    def _retry(cls, ip_address: str, attempt: int):
+        cls._retries.pop(ip_address, None)
+        if cls._stopping or not cls._put(ip_address, attempt):
+            cls._tracked.discard(ip_address)
+
+    @classmethod
+    async def drain(cls):
+        """Finish queued lookups, for at most DRAIN_TIMEOUT_SECONDS, and stop the workers. Called on shutdown."""
+        if not cls._workers:
+            return
+        cls._stopping = True
+        for handle in cls._retries.values():
+            handle.cancel()
+        cls._retries.clear()
+        try:
+            await asyncio.wait_for(cls._queue.join(), cls.DRAIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            Logger.warning(f'Stopped device enrichment with {cls._queue.qsize()} IPs still queued')
+        for worker in cls._workers:
+            worker.cancel()
+        await asyncio.gather(*cls._workers, return_exceptions=True)
+        cls._workers = []
+        cls._tracked.clear()
+        Logger.info(f'Device enrichment queue drained, {cls.enriched} IPs enriched in total')
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            'running': cls.is_running(),
+            'depth': cls._queue.qsize() if cls._queue else 0,
+            'waiting_retry': len(cls._retries),
+            'submitted': cls.submitted,
+            'deduplicated': cls.deduplicated,
+            'rejected': cls.rejected,
+            'invalid': cls.invalid,
+            'enriched': cls.enriched,
+            'retried': cls.retried,
+            'failed': cls.failed,
+            'settings': {
+                'workers': cls.WORKERS,
+                'max_queue': cls.MAX_QUEUE,
+                'max_attempts': cls.MAX_ATTEMPTS,
+                'retry_delay_seconds': cls.RETRY_DELAY_SECONDS,
+                'refresh_seconds': cls.REFRESH_SECONDS
+            }
+        }
@@ -0,0 +1,270 @@
+import csv
+import ipaddress
+import os
+import struct
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from app.utils.logger.logger import Logger
+
+load_dotenv()
+
+# File layout, all little-endian, every section 8-byte aligned:
+#   header    MAGIC, then uint64 ipv4_count, ipv6_count, string_count, string_bytes
+#   ipv4      start u32[n], end u32[n], record[n]
+#   ipv6      start_hi u64[n], start_lo u64[n], end_hi u64[n], end_lo u64[n], record[n]
+#   strings   offsets u32[string_count + 1], utf-8 bytes
+# Ranges are sorted by start and do not overlap. String 0 is the empty string.
+MAGIC = b'IPGEODB1'
+HEADER = struct.Struct('<8sQQQQ')
+RECORD = np.dtype([('country', 'S2'), ('flags', 'u1'), ('_pad', 'u1'),
+                   ('asn', '<u4'), ('city', '<u4'), ('as_org', '<u4')])
+FLAG_DATACENTER = 1
+LOW_64 = (1 << 64) - 1
+
+# Accepted CSV header names for each field
+CSV_COLUMNS = {
+    'network': ('network', 'cidr', 'prefix'),
+    'start_ip': ('start_ip', 'ip_start', 'first_ip', 'range_start'),
+    'end_ip': ('end_ip', 'ip_end', 'last_ip', 'range_end'),
+    'country_code': ('country_code', 'country_iso_code', 'country'),
+    'city': ('city', 'city_name'),
+    'asn': ('asn', 'autonomous_system_number'),
+    'as_org': ('as_org', 'asn_org', 'autonomous_system_organization', 'organization'),
+    'is_datacenter': ('is_datacenter', 'datacenter', 'hosting'),
+}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class GeoIPDatabase:
+    """Read-only view of a database file built by `make build-geoip-db`.
+
+    The file is memory-mapped, so every worker process shares the same page cache and
+    opening it costs nothing up front. A lookup is a binary search over the start column.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mmap = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, n4, n6, n_strings, string_bytes = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a GeoIP database')
+        self.ipv4_count = n4
+        self.ipv6_count = n6
+
+        offset = _align(HEADER.size)
+
+        def section(dtype, count):
+            nonlocal offset
+            array = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+            offset = _align(offset + array.nbytes)
+            return array
+
+        # Integer columns are searched through memoryviews: bisect on those returns Python
+        # ints per probe, where np.searchsorted with a Python int converts the whole column
+        self._v4_start = memoryview(section('<u4', n4))
+        self._v4_end = memoryview(section('<u4', n4))
+        self._v4_records = section(RECORD, n4)
+        self._v6_start_hi = memoryview(section('<u8', n6))
+        self._v6_start_lo = memoryview(section('<u8', n6))
+        self._v6_end_hi = memoryview(section('<u8', n6))
+        self._v6_end_lo = memoryview(section('<u8', n6))
+        self._v6_records = section(RECORD, n6)
+        self._string_offsets = section('<u4', n_strings + 1)
+        self._strings = section(np.uint8, string_bytes)
+
+    def _string(self, index: int) -> Optional[str]:
+        if index == 0:
+            return None
+        start, end = self._string_offsets[index], self._string_offsets[index + 1]
+        return self._strings[start:end].tobytes().decode()
+
+    def _v6_index(self, value: int) -> int:
+        # Last range whose (hi, lo) start is <= the address: narrow by hi, then search lo
+        hi, lo = value >> 64, value & LOW_64
+        first = bisect_left(self._v6_start_hi, hi)
+        last = bisect_right(self._v6_start_hi, hi, first)
+        return bisect_right(self._v6_start_lo, lo, first, last) - 1
+
+    def lookup(self, ip_address: str) -> Optional[Dict[str, Any]]:
+        ip = ipaddress.ip_address(ip_address)
+        value = int(ip)
+        if ip.version == 4:
+            i = bisect_right(self._v4_start, value) - 1
+            if i < 0 or value > self._v4_end[i]:
+                return None
+            record = self._v4_records[i]
+        else:
+            i = self._v6_index(value)
+            if i < 0 or value > (self._v6_end_hi[i] << 64 | self._v6_end_lo[i]):
+                return None
+            record = self._v6_records[i]
+        return {
+            'country_code': record['country'].decode() or None,
+            'city': self._string(int(record['city'])),
+            'asn': int(record['asn']) or None,
+            'as_org': self._string(int(record['as_org'])),
+            'is_datacenter': bool(record['flags'] & FLAG_DATACENTER)
+        }
+
+
+def read_csv(path: str) -> Tuple[List[Tuple[int, int, int, Dict[str, Any]]], int]:
+    """Parse a GeoIP/ASN CSV dump into (version, start, end, fields) ranges.
+
+    The CSV needs a header row with either a network (CIDR) column or start_ip and end_ip
+    columns, plus any of country_code, city, asn, as_org and is_datacenter. Common
+    alternative names (e.g. the GeoLite2 ASN ones) are accepted. Returns the ranges and
+    the number of rows skipped as invalid.
+    """
+    ranges = []
+    skipped = 0
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        headers = {name.strip().lower(): name for name in reader.fieldnames or []}
+        column = {field: next((headers[name] for name in names if name in headers), None)
+                  for field, names in CSV_COLUMNS.items()}
+        if not column['network'] and not (column['start_ip'] and column['end_ip']):
+            raise ValueError(f'{path} needs a network column or start_ip and end_ip columns')
+
+        def value(row, field):
+            return (row.get(column[field]) or '').strip() if column[field] else ''
+
+        for row in reader:
+            try:
+                if column['network'] and value(row, 'network'):
+                    network = ipaddress.ip_network(value(row, 'network'), strict=False)
+                    version, start, end = network.version, int(network.network_address), int(network.broadcast_address)
+                else:
+                    first, last = ipaddress.ip_address(value(row, 'start_ip')), ipaddress.ip_address(value(row, 'end_ip'))
+                    if first.version != last.version or first > last:
+                        raise ValueError('bad range')
+                    version, start, end = first.version, int(first), int(last)
+                asn = value(row, 'asn').upper().lstrip('AS')
+                ranges.append((version, start, end, {
+                    'country_code': value(row, 'country_code').upper()[:2],
+                    'city': value(row, 'city'),
+                    'asn': int(asn) if asn else 0,
+                    'as_org': value(row, 'as_org'),
+                    'is_datacenter': value(row, 'is_datacenter').lower() in TRUE_VALUES
+                }))
+            except ValueError:
+                skipped += 1
+    return ranges, skipped
+
+
+def write_database(ranges: Iterable[Tuple[int, int, int, Dict[str, Any]]], path: str) -> Dict[str, int]:
+    """Write ranges to path atomically. Ranges overlapping an earlier-starting one are dropped."""
+    strings: Dict[str, int] = {'': 0}
+
+    def intern(text: str) -> int:
+        return strings.setdefault(text, len(strings))
+
+    by_version: Dict[int, List] = {4: [], 6: []}
+    overlapping = 0
+    for version, start, end, fields in sorted(ranges, key=lambda r: (r[0], r[1], r[2])):
+        kept = by_version[version]
+        if kept and start <= kept[-1][1]:
+            overlapping += 1
+            continue
+        kept.append((start, end, (
+            fields['country_code'].encode('ascii', 'replace')[:2],
+            FLAG_DATACENTER if fields['is_datacenter'] else 0, 0,
+            fields['asn'], intern(fields['city']), intern(fields['as_org'])
+        )))
+
+    def column(values, dtype):
+        return np.array(values, dtype=dtype)
+
+    v4, v6 = by_version[4], by_version[6]
+    sections = [
+        column([r[0] for r in v4], '<u4'), column([r[1] for r in v4], '<u4'), column([r[2] for r in v4], RECORD),
+        column([r[0] >> 64 for r in v6], '<u8'), column([r[0] & LOW_64 for r in v6], '<u8'),
+        column([r[1] >> 64 for r in v6], '<u8'), column([r[1] & LOW_64 for r in v6], '<u8'),
+        column([r[2] for r in v6], RECORD),
+    ]
+    encoded = [text.encode() for text in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+    sections += [offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)]
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(v4), len(v6), len(encoded), int(offsets[-1])))
+        for array in sections:
+            f.write(b'\0' * (_align(f.tell()) - f.tell()))
+            f.write(array.tobytes())
+    # Workers that already mapped the old file keep reading it until they reopen
+    os.replace(tmp_path, path)
+    return {'ipv4_ranges': len(v4), 'ipv6_ranges': len(v6), 'strings': len(encoded), 'overlapping': overlapping}
+
+
+class GeoIP:
+    """Optional local geolocation and ASN data for IPCheckService, enabled by GEOIP_DB_PATH.
+
+    With GEOIP_SKIP_REMOTE set, IPs the database knows are answered locally without the
+    reputation provider (so without VPN, proxy or fraud score data). Otherwise the remote
+    result is filled in from the database where it is empty, and used alone when the remote
+    lookup fails.
+    """
+    DB_PATH = os.getenv('GEOIP_DB_PATH', '')
+    SKIP_REMOTE = os.getenv('GEOIP_SKIP_REMOTE', 'false').lower() in TRUE_VALUES
+
+    database: Optional[GeoIPDatabase] = None
+    _failed = False
+
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def _open(cls) -> Optional[GeoIPDatabase]:
+        if cls.database is None and cls.DB_PATH and not cls._failed:
+            try:
+                cls.database = GeoIPDatabase(cls.DB_PATH)
+                Logger.info(f'Opened GeoIP database {cls.DB_PATH}: '
+                            f'{cls.database.ipv4_count} IPv4 and {cls.database.ipv6_count} IPv6 ranges')
+            except Exception as e:
+                # Stay disabled rather than retrying the open on every lookup
+                cls._failed = True
+                Logger.error(f'Error opening GeoIP database {cls.DB_PATH}: {str(e)}')
+        return cls.database
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return cls._open() is not None
+
+    @classmethod
+    def lookup(cls, ip_address: str) -> Optional[Dict[str, Any]]:
+        """Local record for an IP, or None. Raises ValueError for a malformed address."""
+        database = cls._open()
+        if database is None:
+            return None
+        try:
+            record = database.lookup(ip_address)
+        except ValueError:
+            raise
+        except Exception as e:
+            Logger.error(f'Error looking up {ip_address} in GeoIP database: {str(e)}')
+            return None
+        if record is None:
+            cls.misses += 1
+        else:
+            cls.hits += 1
+        return record
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        database = cls._open()
+        return {
+            'enabled': database is not None,
+            'path': cls.DB_PATH or None,
+            'skip_remote': cls.SKIP_REMOTE,
+            'ipv4_ranges': database.ipv4_count if database else 0,
+            'ipv6_ranges': database.ipv6_count if database else 0,
+            'hits': cls.hits,
+            'misses': cls.misses
+        }
@@ -0,0 +1,135 @@
+import ipaddress
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from app.core.db.db import MongoDB
+from app.models.user.info.ipcheck import IPCheckResult
+from app.utils.logger.logger import Logger
+
+load_dotenv()
+
+
+class IPReputationStore:
+    """Successful IP reputation lookups, persisted in MongoDB and shared by every worker.
+
+    risk_score is the provider's answer; IPCheckService adds the AI provider bonus on every read,
+    so stored entries follow reloaded provider ranges. Expired by a TTL index on fetched_at.
+    """
+    collection_name = 'ip_reputation'
+    # Also the expireAfterSeconds of the fetched_at_ttl index. Changing it needs a collMod on
+    # that index, create_indexes will not alter an existing one.
+    TTL_SECONDS = int(os.getenv('IP_REPUTATION_TTL_SECONDS', str(7 * 86400)))
+    # Per-device and per-request fields are not part of an IP's reputation
+    DEVICE_FIELDS = {'user_id', 'ip_address', 'mac_address', 'device_id', 'device_name', 'last_seen', 'enriched_at'}
+    WRITE_BATCH_SIZE = 500
+
+    hits = 0
+    misses = 0
+    writes = 0
+
+    @classmethod
+    def _fresh_since(cls) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=cls.TTL_SECONDS)
+
+    @classmethod
+    def _document(cls, result: IPCheckResult, fetched_at: datetime) -> dict:
+        return {**result.model_dump(exclude=cls.DEVICE_FIELDS), 'fetched_at': fetched_at}
+
+    @staticmethod
+    def _result(document: dict) -> IPCheckResult:
+        return IPCheckResult.model_validate(
+            {key: value for key, value in document.items() if key not in ('_id', 'fetched_at')}
+        )
+
+    @classmethod
+    async def get(cls, ip_address: str) -> Optional[IPCheckResult]:
+        if MongoDB.db is None:
+            return None
+        try:
+            document = await MongoDB.db[cls.collection_name].find_one(
+                {'_id': ip_address, 'fetched_at': {'$gte': cls._fresh_since()}}
+            )
+        except Exception as e:
+            Logger.error(f'Error reading stored reputation for IP {ip_address}: {str(e)}')
+            return None
+        if document is None:
+            cls.misses += 1
+            return None
+        cls.hits += 1
+        return cls._result(document)
+
+    @classmethod
+    async def fresh_ips(cls, ip_addresses: List[str]) -> List[str]:
+        """The subset of ip_addresses that already has an unexpired stored reputation, empty if the store is unreachable."""
+        if MongoDB.db is None:
+            return []
+        try:
+            cursor = MongoDB.db[cls.collection_name].find(
+                {'_id': {'$in': ip_addresses}, 'fetched_at': {'$gte': cls._fresh_since()}}, {'_id': 1}
+            )
+            return [document['_id'] async for document in cursor]
+        except Exception as e:
+            Logger.error(f'Error reading stored reputations for {len(ip_addresses)} IPs: {str(e)}')
+            return []
+
+    @classmethod
+    async def put(cls, ip_address: str, result: IPCheckResult):
+        if MongoDB.db is None:
+            return
+        try:
+            await MongoDB.db[cls.collection_name].replace_one(
+                {'_id': ip_address}, cls._document(result, datetime.utcnow()), upsert=True
+            )
+            cls.writes += 1
+        except Exception as e:
+            Logger.error(f'Error storing reputation for IP {ip_address}: {str(e)}')
+
+    @classmethod
+    async def put_many(cls, results: Iterable[Tuple[str, IPCheckResult]]) -> int:
+        """Upsert many reputations in unordered bulk writes. Returns how many were written."""
+        if MongoDB.db is None:
+            return 0
+        fetched_at = datetime.utcnow()
+        operations = [
+            UpdateOne({'_id': ip_address}, {'$set': cls._document(result, fetched_at)}, upsert=True)
+            for ip_address, result in results
+        ]
+        written = 0
+        for start in range(0, len(operations), cls.WRITE_BATCH_SIZE):
+            batch = operations[start:start + cls.WRITE_BATCH_SIZE]
+            try:
+                await MongoDB.db[cls.collection_name].bulk_write(batch, ordered=False)
+            except Exception as e:
+                Logger.error(f'Error storing reputations for {len(batch)} IPs: {str(e)}')
+                continue
+            written += len(batch)
+        cls.writes += written
+        return written
+
+    @classmethod
+    async def delete(cls, ip_address: Optional[str] = None) -> Optional[int]:
+        """Remove one IP's stored reputation, or all of them when no IP is given. None if the store is unreachable."""
+        if ip_address is not None:
+            try:
+                ip_address = str(ipaddress.ip_address(ip_address))
+            except ValueError:
+                return 0
+        if MongoDB.db is None:
+            return None
+        try:
+            result = await MongoDB.db[cls.collection_name].delete_many({'_id': ip_address} if ip_address else {})
+            return result.deleted_count
+        except Exception as e:
+            Logger.error(f'Error deleting stored reputation for {ip_address or "all IPs"}: {str(e)}')
+            return None
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        return {
+            'ttl_seconds': cls.TTL_SECONDS,
+            'hits': cls.hits,
+            'misses': cls.misses,
+            'writes': cls.writes
+        }
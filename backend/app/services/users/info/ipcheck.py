@@ -1,30 +1,40 @@
-import aiohttp
+import asyncio
 import ipaddress
+from app.core.http.client import HTTPClient
 from app.models.user.info.ipcheck import IPCheckResult
+from app.services.users.info.provider_ranges import ProviderRanges
+from app.services.users.info.geoip import GeoIP
+from app.services.users.info.ip_reputation import IPReputationStore
+from app.utils.cache.ttl_cache import TTLCache, MISSING
 from app.utils.logger.logger import Logger
 import os
 from dotenv import load_dotenv
-from typing import Dict
-
-# Define AI provider IP ranges
-AI_PROVIDER_RANGES = {
-    'Azure': ipaddress.IPv4Network('20.33.0.0/16'),
-    'AWS': ipaddress.IPv4Network('3.5.140.0/22')
-}
+from typing import Any, Dict, Optional, Tuple
 
 load_dotenv()
 
 class IPCheckService:
     IPQUALITYSCORE_API_KEY = os.getenv("IPQUALITYSCORE_API_KEY")
+    IPQUALITYSCORE_URL = os.getenv("IPQUALITYSCORE_URL", "https://ipqualityscore.com/api/json/ip")
+    CACHE_TTL_SECONDS = float(os.getenv('IP_CHECK_CACHE_TTL_SECONDS', '3600'))
+    # Failed lookups are retried soon, but not on every request while the API is down
+    CACHE_ERROR_TTL_SECONDS = float(os.getenv('IP_CHECK_CACHE_ERROR_TTL_SECONDS', '60'))
+    cache = TTLCache('ip_checks', CACHE_TTL_SECONDS, int(os.getenv('IP_CHECK_CACHE_MAX_SIZE', '10000')))
+
+    _in_flight: Dict[str, asyncio.Future] = {}
+
+    upstream_calls = 0
+    upstream_errors = 0
+    coalesced_calls = 0
+    remote_skipped = 0
 
     @classmethod
     def _check_ai_provider(cls, ip_address: str) -> Dict[str, str]:
         try:
-            ip = ipaddress.IPv4Address(ip_address)
-            for provider, ip_range in AI_PROVIDER_RANGES.items():
-                if ip in ip_range:
-                    Logger.info(f'IP {ip_address} identified as {provider} AI agent')
-                    return {'is_ai_agent': True, 'ai_provider': provider}
+            provider = ProviderRanges.lookup(ip_address)
+            if provider:
+                Logger.info(f'IP {ip_address} identified as {provider} AI agent')
+                return {'is_ai_agent': True, 'ai_provider': provider}
             return {'is_ai_agent': False, 'ai_provider': None}
         except Exception as e:
             Logger.error(f'Error checking AI provider for IP {ip_address}: {str(e)}')
@@ -32,34 +42,152 @@ class IPCheckService:
 
     @classmethod
     async def check_ip(cls, ip_address: str) -> IPCheckResult:
+        """Reputation of an IP, served from the cache while fresh. Failed lookups are cached briefly."""
+        result, _ = await cls.check(ip_address)
+        return result
+
+    @classmethod
+    async def check(cls, ip_address: str) -> Tuple[IPCheckResult, bool]:
+        """Like check_ip, but also says whether the reputation is real or a fallback from a failed lookup."""
+        try:
+            ip = ipaddress.ip_address(ip_address)
+        except ValueError:
+            Logger.error(f"Error checking IP {ip_address}: not a valid IP address")
+            return IPCheckResult(is_vpn=False, is_proxy=False, country_code="UNKNOWN", city=None), False
+        if ip.is_private:
+            return IPCheckResult(is_vpn=False, is_proxy=False, country_code="LOCAL", city="LOCAL"), True
+
+        # Normalised so every spelling of an IPv6 address shares one entry
+        key = str(ip)
+        cached = cls.cache.get(key)
+        if cached is not MISSING:
+            result, ok = cached
+            return result.model_copy(), ok
+
+        # Concurrent misses for one IP share a single lookup. The lookup runs as its own task,
+        # so a caller that is cancelled does not cancel it for the others.
+        lookup = cls._in_flight.get(key)
+        if lookup is None:
+            lookup = asyncio.ensure_future(cls._lookup_and_cache(key))
+            cls._in_flight[key] = lookup
+            lookup.add_done_callback(lambda _: cls._in_flight.pop(key, None))
+        else:
+            cls.coalesced_calls += 1
+        result, ok = await asyncio.shield(lookup)
+        return result.model_copy(), ok
+
+    @classmethod
+    async def _lookup_and_cache(cls, ip_address: str) -> Tuple[IPCheckResult, bool]:
+        local = GeoIP.lookup(ip_address)
+        if local is not None and GeoIP.SKIP_REMOTE:
+            cls.remote_skipped += 1
+            result, ok = cls._local_result(ip_address, local), True
+        else:
+            # Reputations fetched by any worker, or before a restart, are read back first
+            result = await IPReputationStore.get(ip_address)
+            ok = result is not None
+            if not ok:
+                result, ok = await cls.fetch(ip_address, local)
+                if ok:
+                    await IPReputationStore.put(ip_address, result)
+        # Applied after storing, so reloaded provider ranges reach stored reputations too
+        result = cls._with_ai_provider(ip_address, result)
+        cls.cache.set(ip_address, (result, ok), None if ok else cls.CACHE_ERROR_TTL_SECONDS)
+        return result, ok
+
+    @classmethod
+    async def fetch(cls, ip_address: str, local: Optional[Dict[str, Any]] = MISSING) -> Tuple[IPCheckResult, bool]:
+        """Call the provider, bypassing every cache, and fill gaps from the GeoIP database. No AI provider check."""
+        if local is MISSING:
+            local = GeoIP.lookup(ip_address)
+        result, ok = await cls._lookup(ip_address)
+        if local is not None:
+            result = cls._fill_from_local(result, local, ok)
+        return result, ok
+
+    @classmethod
+    def _with_ai_provider(cls, ip_address: str, result: IPCheckResult) -> IPCheckResult:
+        # Increase risk score if it's an AI agent
+        if cls._check_ai_provider(ip_address)['is_ai_agent']:
+            result.risk_score = min(result.risk_score + 50, 100)
+        return result
+
+    @classmethod
+    def _local_result(cls, ip_address: str, local: Dict[str, Any]) -> IPCheckResult:
+        return IPCheckResult(
+            is_datacenter=local['is_datacenter'],
+            country_code=local['country_code'] or "",
+            city=local['city'],
+            asn=local['asn'],
+            as_org=local['as_org']
+        )
+
+    @staticmethod
+    def _fill_from_local(result: IPCheckResult, local: Dict[str, Any], ok: bool) -> IPCheckResult:
+        # The provider's answer wins where it has one; a failed lookup keeps only local data
+        if not ok or not result.country_code:
+            result.country_code = local['country_code'] or result.country_code
+        result.city = result.city or local['city']
+        result.is_datacenter = result.is_datacenter or local['is_datacenter']
+        result.asn = result.asn or local['asn']
+        result.as_org = result.as_org or local['as_org']
+        return result
+
+    @classmethod
+    async def _lookup(cls, ip_address: str) -> Tuple[IPCheckResult, bool]:
+        """Call IPQualityScore. Returns the provider's answer and whether the lookup succeeded."""
+        cls.upstream_calls += 1
         try:
-            if ipaddress.ip_address(ip_address).is_private:
-                return IPCheckResult(is_vpn=False, is_proxy=False, country_code="LOCAL", city="LOCAL")
-            
-            # Check if IP is from an AI provider
-            ai_check = cls._check_ai_provider(ip_address)
-
-            async with aiohttp.ClientSession() as session:
-                url = f"https://ipqualityscore.com/api/json/ip/{cls.IPQUALITYSCORE_API_KEY}/{ip_address}"
-                async with session.get(url) as response:
-                    data = await response.json()
-                    base_risk_score = data.get("fraud_score", 0)
-                    
-                    # Increase risk score if it's an AI agent
-                    if ai_check['is_ai_agent']:
-                        base_risk_score += 50
-                    
-                    return IPCheckResult(
-                        is_vpn=data.get("vpn", False),
-                        is_proxy=data.get("proxy", False),
-                        is_datacenter=data.get("datacenter", False),
-                        is_tor=data.get("tor", False),
-                        is_ai_agent=ai_check['is_ai_agent'],
-                        ai_provider=ai_check['ai_provider'],
-                        risk_score=min(base_risk_score, 100),  # Cap at 100
-                        country_code=data.get("country_code", ""),
-                        city=data.get("city", None)
-                    )
+            session = HTTPClient.get_session()
+            url = f"{cls.IPQUALITYSCORE_URL}/{cls.IPQUALITYSCORE_API_KEY}/{ip_address}"
+            async with session.get(url) as response:
+                data = await response.json()
+                if data.get("success") is False:
+                    raise ValueError(data.get("message", "lookup rejected"))
+                return IPCheckResult(
+                    is_vpn=data.get("vpn", False),
+                    is_proxy=data.get("proxy", False),
+                    is_datacenter=data.get("datacenter", False),
+                    is_tor=data.get("tor", False),
+                    risk_score=min(data.get("fraud_score", 0), 100),  # Cap at 100
+                    country_code=data.get("country_code", ""),
+                    city=data.get("city", None),
+                    asn=data.get("ASN") or None,
+                    as_org=data.get("ISP") or None
+                ), True
         except Exception as e:
+            cls.upstream_errors += 1
             Logger.error(f"Error checking IP {ip_address}: {str(e)}")
-            return IPCheckResult(is_vpn=False, is_proxy=False, country_code="UNKNOWN", city=None)
+            return IPCheckResult(is_vpn=False, is_proxy=False, country_code="UNKNOWN", city=None), False
+
+    @classmethod
+    def flush_cache(cls, ip_address: Optional[str] = None) -> int:
+        """Drop one IP's cached reputation, or every entry when no IP is given."""
+        if ip_address is None:
+            return cls.cache.clear()
+        try:
+            ip_address = str(ipaddress.ip_address(ip_address))
+        except ValueError:
+            return 0
+        return int(cls.cache.invalidate(ip_address))
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        avoided = {
+            'cache': cls.cache.hits,
+            'coalesced': cls.coalesced_calls,
+            'store': IPReputationStore.hits,
+            'geoip': cls.remote_skipped
+        }
+        return {
+            **cls.cache.stats(),
+            'remote_calls_avoided': sum(avoided.values()),
+            'remote_calls_avoided_by': avoided,
+            'store': IPReputationStore.stats(),
+            'error_ttl_seconds': cls.CACHE_ERROR_TTL_SECONDS,
+            'upstream_calls': cls.upstream_calls,
+            'upstream_errors': cls.upstream_errors,
+            'coalesced_calls': cls.coalesced_calls,
+            'remote_skipped': cls.remote_skipped,
+            'in_flight': len(cls._in_flight)
+        }
@@ -0,0 +1,221 @@
+import asyncio
+import ipaddress
+import json
+import os
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+from app.utils.logger.logger import Logger
+
+load_dotenv()
+
+Network = ipaddress._BaseNetwork
+# Keys that hold prefixes in the published AWS, GCP and Azure range files
+JSON_PREFIX_KEYS = {'ip_prefix', 'ipv6_prefix', 'ipv4Prefix', 'ipv6Prefix', 'addressPrefixes'}
+
+
+class RangeIndex:
+    """Longest-prefix match over CIDR ranges, flattened into sorted disjoint intervals for bisect lookups."""
+
+    def __init__(self, ranges: Iterable[Tuple[Network, str]]):
+        by_version: Dict[int, List[Tuple[int, int, str]]] = {4: [], 6: []}
+        self.prefixes = 0
+        for network, provider in ranges:
+            by_version[network.version].append(
+                (int(network.network_address), int(network.broadcast_address), provider)
+            )
+            self.prefixes += 1
+        self._starts: Dict[int, List[int]] = {}
+        self._ends: Dict[int, List[int]] = {}
+        self._providers: Dict[int, List[str]] = {}
+        for version, intervals in by_version.items():
+            segments = self._flatten(intervals)
+            self._starts[version] = [start for start, _, _ in segments]
+            self._ends[version] = [end for _, end, _ in segments]
+            self._providers[version] = [provider for _, _, provider in segments]
+
+    @staticmethod
+    def _flatten(intervals: List[Tuple[int, int, str]]) -> List[Tuple[int, int, str]]:
+        segments: List[Tuple[int, int, str]] = []
+        # Blocks that contain the cursor, innermost last, as (end, provider)
+        open_blocks: List[Tuple[int, str]] = []
+        cursor = 0
+
+        def emit(start: int, end: int, provider: str):
+            if segments and segments[-1][2] == provider and segments[-1][1] + 1 == start:
+                segments[-1] = (segments[-1][0], end, provider)
+            else:
+                segments.append((start, end, provider))
+
+        def close_before(position: Optional[int]):
+            nonlocal cursor
+            while open_blocks and (position is None or open_blocks[-1][0] < position):
+                end, provider = open_blocks.pop()
+                if cursor <= end:
+                    emit(cursor, end, provider)
+                    cursor = end + 1
+
+        # Outer blocks sort before the blocks nested at their start; on exact duplicates the last one wins
+        for start, end, provider in sorted(intervals, key=lambda interval: (interval[0], -interval[1])):
+            close_before(start)
+            if open_blocks and cursor < start:
+                emit(cursor, start - 1, open_blocks[-1][1])
+            cursor = start
+            open_blocks.append((end, provider))
+        close_before(None)
+        return segments
+
+    def lookup(self, ip: ipaddress._BaseAddress) -> Optional[str]:
+        value = int(ip)
+        starts = self._starts[ip.version]
+        i = bisect_right(starts, value) - 1
+        if i >= 0 and value <= self._ends[ip.version][i]:
+            return self._providers[ip.version][i]
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'prefixes': self.prefixes,
+            'ipv4_intervals': len(self._starts[4]),
+            'ipv6_intervals': len(self._starts[6])
+        }
+
+
+def _json_prefixes(data: Any) -> Iterator[str]:
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key in JSON_PREFIX_KEYS:
+                yield from ([value] if isinstance(value, str) else value)
+            else:
+                yield from _json_prefixes(value)
+    elif isinstance(data, list):
+        for item in data:
+            if isinstance(item, str):
+                yield item
+            else:
+                yield from _json_prefixes(item)
+
+
+def read_range_file(path: str) -> List[Tuple[Network, str]]:
+    """Parse one .txt (`<cidr> [provider]` lines) or .json (AWS, GCP, Azure or plain list) range file."""
+    # Lines that do not name a provider get the file name
+    default_provider = os.path.splitext(os.path.basename(path))[0]
+    with open(path) as f:
+        if path.endswith('.json'):
+            entries = [(prefix, default_provider) for prefix in _json_prefixes(json.load(f))]
+        else:
+            entries = []
+            for line in f:
+                parts = line.split('#', 1)[0].split()
+                if parts:
+                    entries.append((parts[0], parts[1] if len(parts) > 1 else default_provider))
+
+    ranges = []
+    for prefix, provider in entries:
+        try:
+            ranges.append((ipaddress.ip_network(prefix, strict=False), provider))
+        except ValueError:
+            Logger.warning(f'Skipping invalid prefix {prefix} in {path}')
+    return ranges
+
+
+class ProviderRanges:
+    """Provider ranges from RANGES_DIR plus the defaults, rebuilt in the background when files change."""
+    RANGES_DIR = os.getenv('PROVIDER_RANGES_DIR', 'app/data/provider_ranges')
+    CHECK_INTERVAL_SECONDS = float(os.getenv('PROVIDER_RANGES_CHECK_SECONDS', '30'))
+    DEFAULT_RANGES = {
+        '20.33.0.0/16': 'Azure',
+        '3.5.140.0/22': 'AWS'
+    }
+
+    index: Optional[RangeIndex] = None
+    _signature: Optional[Tuple] = None
+    _watcher: Optional[asyncio.Task] = None
+    reloads = 0
+
+    @classmethod
+    def _files(cls) -> List[str]:
+        if not os.path.isdir(cls.RANGES_DIR):
+            return []
+        return sorted(
+            os.path.join(cls.RANGES_DIR, name) for name in os.listdir(cls.RANGES_DIR)
+            if name.endswith(('.txt', '.json'))
+        )
+
+    @classmethod
+    def _current_signature(cls) -> Tuple:
+        signature = []
+        for path in cls._files():
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    @classmethod
+    def _build(cls) -> Tuple[RangeIndex, Tuple]:
+        signature = cls._current_signature()
+        ranges = [(ipaddress.ip_network(prefix), provider) for prefix, provider in cls.DEFAULT_RANGES.items()]
+        for path, _, _ in signature:
+            try:
+                ranges.extend(read_range_file(path))
+            except Exception as e:
+                Logger.error(f'Error reading provider ranges from {path}: {str(e)}')
+        return RangeIndex(ranges), signature
+
+    @classmethod
+    def load(cls) -> Dict[str, Any]:
+        cls.index, cls._signature = cls._build()
+        cls.reloads += 1
+        Logger.info(f'Loaded {cls.index.prefixes} provider prefixes from {len(cls._signature)} files')
+        return cls.stats()
+
+    @classmethod
+    async def reload(cls) -> Dict[str, Any]:
+        """Rebuild the index in a worker thread and swap it in."""
+        index, signature = await asyncio.to_thread(cls._build)
+        cls.index, cls._signature = index, signature
+        cls.reloads += 1
+        Logger.info(f'Reloaded {index.prefixes} provider prefixes from {len(signature)} files')
+        return cls.stats()
+
+    @classmethod
+    def lookup(cls, ip_address: str) -> Optional[str]:
+        if cls.index is None:
+            cls.load()
+        return cls.index.lookup(ipaddress.ip_address(ip_address))
+
+    @classmethod
+    async def _watch(cls):
+        while True:
+            await asyncio.sleep(cls.CHECK_INTERVAL_SECONDS)
+            try:
+                if cls._current_signature() != cls._signature:
+                    await cls.reload()
+            except Exception as e:
+                Logger.error(f'Error reloading provider ranges: {str(e)}')
+
+    @classmethod
+    def start(cls):
+        if cls.index is None:
+            cls.load()
+        if cls._watcher is None or cls._watcher.done():
+            cls._watcher = asyncio.create_task(cls._watch())
+
+    @classmethod
+    async def stop(cls):
+        if cls._watcher is None:
+            return
+        cls._watcher.cancel()
+        try:
+            await cls._watcher
+        except asyncio.CancelledError:
+            pass
+        cls._watcher = None
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            'ranges_dir': cls.RANGES_DIR,
+            'files': [path for path, _, _ in cls._signature or ()],
+            'reloads': cls.reloads,
+            **(cls.index.stats() if cls.index else {})
+        }
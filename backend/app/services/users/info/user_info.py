@@ -1,6 +1,7 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app.services.users.info.ipcheck import IPCheckService
 from app.models.user.info.ipcheck import IPCheckResult
 from app.utils.logger.logger import Logger
@@ -9,37 +10,69 @@ from app.core.db.db import MongoDB
 class UserInfoService:
     collection_name = "user_info"
 
+    # Reputation fields written by enrichment; device details from the client are left alone
+    REPUTATION_FIELDS = {'is_vpn', 'is_proxy', 'is_datacenter', 'is_tor', 'risk_score', 'country_code', 'city',
+                         'asn', 'as_org'}
+
     @classmethod
     async def add_device(cls, user_id: str, ip_address: str) -> str:
-        try:
-            ip_check = await IPCheckService.check_ip(ip_address)
+        """Record a sighting of user_id at ip_address and queue the IP's reputation lookup.
 
-            device = IPCheckResult(
-                user_id=user_id,
-                ip_address=ip_address,
-                **ip_check.model_dump(exclude={'user_id', 'ip_address', 'last_seen'}),
-                last_seen=datetime.now()
-            )
+        The sighting is a single upsert, so callers never wait on the reputation provider.
+        New devices, and devices enriched more than DeviceEnrichmentQueue.REFRESH_SECONDS ago,
+        are queued for enrichment; until then they carry default reputation fields.
+        """
+        from app.services.users.info.enrichment_queue import DeviceEnrichmentQueue
 
-            result = await MongoDB.db[cls.collection_name].update_one(
+        try:
+            device_id = ObjectId()
+            defaults = IPCheckResult().model_dump(exclude={'user_id', 'ip_address', 'last_seen'})
+            previous = await MongoDB.db[cls.collection_name].find_one_and_update(
                 {
                     'user_id': user_id,
                     'ip_address': ip_address
                 },
                 {
-                    '$set': device.model_dump()
+                    '$set': {'last_seen': datetime.now()},
+                    '$setOnInsert': {'_id': device_id, **defaults}
                 },
-                upsert=True
+                projection={'enriched_at': 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
             )
 
-            if result.upserted_id:
-                return str(result.upserted_id)
+            enriched_at = previous.get('enriched_at') if previous else None
+            if enriched_at is None or \
+                    enriched_at < datetime.now() - timedelta(seconds=DeviceEnrichmentQueue.REFRESH_SECONDS):
+                await DeviceEnrichmentQueue.submit(ip_address)
+
+            if previous is None:
+                return str(device_id)
             return "updated"
 
         except Exception as e:
             Logger.error(f"Error adding device: {str(e)}")
             return None
 
+    @classmethod
+    async def enrich_ip(cls, ip_address: str) -> bool:
+        """Look up an IP's reputation and write it to every device seen at that IP.
+
+        Returns False when the lookup or the write failed, so the caller can retry.
+        """
+        try:
+            ip_check, ok = await IPCheckService.check(ip_address)
+            if not ok:
+                return False
+            await MongoDB.db[cls.collection_name].update_many(
+                {'ip_address': ip_address},
+                {'$set': {**ip_check.model_dump(include=cls.REPUTATION_FIELDS), 'enriched_at': datetime.now()}}
+            )
+            return True
+        except Exception as e:
+            Logger.error(f"Error enriching devices for IP {ip_address}: {str(e)}")
+            return False
+
     @classmethod
     async def get_user_devices(cls, user_id: str) -> List[dict]:
         try:
@@ -0,0 +1,140 @@
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from app.models.user.events.event import SeverityEnum
+from app.models.company.breach_type.breach_type import BreachTypeEnum
+from app.utils.logger.logger import Logger
+
+load_dotenv()
+
+DAY_MS = 86_400_000
+# Stored terms are w * 2^exponent. Capping the exponent well below the float limit (2^1024)
+# leaves room for summing many events without overflowing.
+MAX_EXPONENT = 900
+# How long after EPOCH the stored state must stay valid. Half-lives shorter than
+# HORIZON_DAYS / MAX_EXPONENT would reach the cap within it and are refused.
+HORIZON_DAYS = float(os.getenv('RISK_DECAY_HORIZON_DAYS', str(20 * 365)))
+MIN_HALF_LIFE_DAYS = HORIZON_DAYS / MAX_EXPONENT
+
+
+def _parse_half_lives(raw: str, allowed) -> Dict[str, float]:
+    half_lives = {}
+    for item in filter(None, (part.strip() for part in raw.split(','))):
+        name, _, days = item.partition('=')
+        name = name.strip().upper()
+        if name not in allowed:
+            Logger.warning(f'Ignoring unknown half-life key {name}')
+            continue
+        # Whole hours, like the bucket keys, so reads decay with the same half-life as writes
+        days = round(float(days) * 24) / 24
+        if days < MIN_HALF_LIFE_DAYS:
+            Logger.error(f'Ignoring half-life of {days} days for {name}: the minimum is '
+                         f'{MIN_HALF_LIFE_DAYS:.1f} days for a {HORIZON_DAYS:.0f} day horizon')
+            continue
+        half_lives[name] = days
+    return half_lives
+
+
+def _naive_utc(timestamp: datetime) -> datetime:
+    # Naive UTC at millisecond precision, the form BSON stores
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+
+
+class RiskDecay:
+    """Time-decayed risk as forward-decay buckets: w * 2^((t - EPOCH) / h) per half-life h, scaled back at read time.
+
+    Changing any setting needs `make rebuild-risk-stats`.
+    """
+    SEVERITY_HALF_LIFE_DAYS = {
+        'LOW': 30.0, 'MEDIUM': 90.0, 'HIGH': 180.0, 'CRITICAL': 365.0,
+        **_parse_half_lives(os.getenv('RISK_DECAY_HALF_LIFE_DAYS', ''), SeverityEnum.__members__)
+    }
+    BREACH_TYPE_HALF_LIFE_DAYS = _parse_half_lives(
+        os.getenv('RISK_DECAY_BREACH_TYPE_HALF_LIFE_DAYS', ''), BreachTypeEnum.__members__
+    )
+    EPOCH = datetime.fromisoformat(os.getenv('RISK_DECAY_EPOCH', '2024-01-01'))
+
+    _capped = False
+
+    @classmethod
+    def half_life_days(cls, severity: Optional[str], breach_type: Optional[str] = None) -> float:
+        breach_type = getattr(breach_type, 'value', breach_type)
+        if breach_type in cls.BREACH_TYPE_HALF_LIFE_DAYS:
+            return cls.BREACH_TYPE_HALF_LIFE_DAYS[breach_type]
+        severity = getattr(severity, 'value', severity)
+        return cls.SEVERITY_HALF_LIFE_DAYS.get(severity, cls.SEVERITY_HALF_LIFE_DAYS['LOW'])
+
+    @staticmethod
+    def bucket(half_life_days: float) -> str:
+        # Whole hours keep the key free of dots, which Mongo would read as a path
+        return f'h{round(half_life_days * 24)}'
+
+    @classmethod
+    def buckets(cls) -> Dict[str, List[float]]:
+        """Every bucket in use, with the configured half-lives that fall into it."""
+        buckets: Dict[str, List[float]] = {}
+        for half_life in sorted({*cls.SEVERITY_HALF_LIFE_DAYS.values(), *cls.BREACH_TYPE_HALF_LIFE_DAYS.values()}):
+            buckets.setdefault(cls.bucket(half_life), []).append(half_life)
+        return buckets
+
+    @classmethod
+    def contribution(cls, weight: float, severity: Optional[str], breach_type: Optional[str],
+                     timestamp: Optional[datetime], sign: int = 1) -> Dict[str, float]:
+        """risk_stats delta for adding (sign=1) or removing (sign=-1) one event. Undated events do not decay-count."""
+        if not isinstance(timestamp, datetime):
+            return {}
+        # Removing an event read back from the database then cancels exactly what adding it contributed
+        timestamp = _naive_utc(timestamp)
+        half_life = cls.half_life_days(severity, breach_type)
+        age_days = (timestamp - cls.EPOCH).total_seconds() / 86400
+        exponent = age_days / half_life
+        if exponent > MAX_EXPONENT:
+            if not cls._capped:
+                cls._capped = True
+                Logger.warning(f'Risk decay exponent capped for a {half_life} day half-life, '
+                               f'move RISK_DECAY_EPOCH forward and rebuild risk stats')
+            exponent = MAX_EXPONENT
+        return {f'decay.{cls.bucket(half_life)}': sign * weight * 2 ** exponent}
+
+    @classmethod
+    def decayed_weight(cls, decay_state: Optional[Dict[str, float]], now: Optional[datetime] = None) -> float:
+        """Sum of the user's event weights, each decayed by its age as of now."""
+        if not decay_state:
+            return 0.0
+        elapsed_days = (_naive_utc(now or datetime.utcnow()) - cls.EPOCH).total_seconds() / 86400
+        total = 0.0
+        for bucket, value in decay_state.items():
+            half_life = int(bucket[1:]) / 24
+            total += value * 2 ** (-elapsed_days / half_life)
+        # Removing events leaves float residue around zero
+        return max(0.0, total)
+
+    @staticmethod
+    def score(decayed_weight: float) -> int:
+        """Map the decayed weight onto 0-100: one fresh CRITICAL event gives 50, two give 75."""
+        return int(100 * (1 - 2 ** -decayed_weight))
+
+    @classmethod
+    def aggregation_fields(cls, weight_expr: Dict[str, Any]) -> Dict[str, Any]:
+        """$group accumulators that compute every decay bucket from raw events, for backfills."""
+        half_life_expr = {
+            '$switch': {
+                'branches': [
+                    *({'case': {'$eq': ['$breach_type', breach_type]}, 'then': days}
+                      for breach_type, days in cls.BREACH_TYPE_HALF_LIFE_DAYS.items()),
+                    *({'case': {'$eq': ['$severity', severity]}, 'then': days}
+                      for severity, days in cls.SEVERITY_HALF_LIFE_DAYS.items())
+                ],
+                'default': cls.SEVERITY_HALF_LIFE_DAYS['LOW']
+            }
+        }
+        age_days = {'$divide': [{'$subtract': ['$timestamp', cls.EPOCH]}, DAY_MS]}
+        exponent = {'$min': [{'$divide': [age_days, half_life_expr]}, MAX_EXPONENT]}
+        contribution = {'$multiply': [weight_expr, {'$pow': [2, exponent]}]}
+        return {
+            f'decay_{bucket}': {'$sum': {'$cond': [{'$in': [half_life_expr, half_lives]}, contribution, 0]}}
+            for bucket, half_lives in cls.buckets().items()
+        }
@@ -0,0 +1,280 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.core.db.db import MongoDB
+from app.services.users.scoring.decay import RiskDecay
+from app.utils.logger.logger import Logger
+
+load_dotenv()
+
+
+class RescoreJobRunningError(RuntimeError):
+    pass
+
+
+class RiskRescoreJob:
+    """Recompute every user's risk_stats and ref_score from their breach events, archived ones included.
+
+    Users are processed in _id order, a chunk at a time: one aggregation over the chunk's
+    events and one unordered bulk_write of the results. Each write only applies if the user's
+    risk_stats are still the ones read before the aggregation, so a score delta that lands
+    in between is not overwritten; those users, and users that got a new delta queued in
+    this process meanwhile, are redone. Progress is checkpointed in the
+    jobs collection after every chunk, so an interrupted run picks up where it stopped.
+    Run it after changing UserService.SEVERITY_WEIGHTS or the RiskDecay settings, to backfill the
+    time-decayed state from history, or to repair drift in the aggregates.
+    """
+    name = 'rescore_users'
+    jobs_collection = 'jobs'
+    CHUNK_SIZE = int(os.getenv('RESCORE_CHUNK_SIZE', '1000'))
+    # A running job that has not checkpointed for this long is assumed dead and may be taken over
+    STALE_AFTER_SECONDS = int(os.getenv('RESCORE_STALE_AFTER_SECONDS', '600'))
+    # Times a chunk's users are redone when their risk_stats keep changing under the job
+    MAX_CHUNK_ATTEMPTS = int(os.getenv('RESCORE_MAX_CHUNK_ATTEMPTS', '5'))
+
+    _task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def status(cls) -> Optional[Dict[str, Any]]:
+        job = await MongoDB.db[cls.jobs_collection].find_one({'_id': cls.name})
+        if not job:
+            return None
+        total = job.get('total') or 0
+        elapsed = (job['updated_at'] - job['started_at']).total_seconds()
+        rate = job['processed'] / elapsed if elapsed > 0 else 0.0
+        job['percent'] = round(min(100.0, job['processed'] / total * 100), 1) if total else 100.0
+        job['users_per_second'] = round(rate, 1)
+        if job['status'] == 'running' and rate > 0:
+            job['eta_seconds'] = round(max(0, total - job['processed']) / rate)
+        job['last_user_id'] = str(job['last_user_id']) if job.get('last_user_id') else None
+        return job
+
+    @classmethod
+    async def _claim(cls, restart: bool) -> Dict[str, Any]:
+        """Mark the job as running, resuming the previous run unless it completed or restart is set."""
+        from app.services.users.user_service import UserService
+
+        jobs = MongoDB.db[cls.jobs_collection]
+        now = datetime.utcnow()
+        existing = await jobs.find_one({'_id': cls.name})
+        if existing and existing['status'] == 'running' and \
+                existing['updated_at'] > now - timedelta(seconds=cls.STALE_AFTER_SECONDS):
+            raise RescoreJobRunningError(f'Rescore is already running, {existing["processed"]} users done')
+
+        if existing is None or restart or existing['status'] == 'completed':
+            state = {
+                'status': 'running',
+                'started_at': now,
+                'updated_at': now,
+                'last_user_id': None,
+                'processed': 0,
+                'updated': 0,
+                'chunks': 0,
+                'total': await MongoDB.db[UserService.collection_name].estimated_document_count(),
+                'error': None
+            }
+        else:
+            state = {'status': 'running', 'updated_at': now, 'error': None}
+            Logger.info(f'Resuming rescore after {existing["processed"]} users')
+
+        if existing is None:
+            try:
+                await jobs.insert_one({'_id': cls.name, **state})
+                return await jobs.find_one({'_id': cls.name})
+            except DuplicateKeyError:
+                raise RescoreJobRunningError('Rescore was started concurrently')
+
+        # Conditional on the document we read, so two concurrent claims cannot both win
+        job = await jobs.find_one_and_update(
+            {'_id': cls.name, 'updated_at': existing['updated_at'], 'status': existing['status']},
+            {'$set': state},
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            raise RescoreJobRunningError('Rescore was started concurrently')
+        return job
+
+    @classmethod
+    def _stats_pipeline(cls, match: Dict[str, Any]) -> List[Dict[str, Any]]:
+        from app.services.users.user_service import UserService
+        from app.services.users.events.breach_event_service import BreachEventService
+
+        weights = UserService.SEVERITY_WEIGHTS
+        weight_by_severity = {
+            '$switch': {
+                'branches': [{'case': {'$eq': ['$severity', severity]}, 'then': weight}
+                             for severity, weight in weights.items()],
+                'default': 0.25
+            }
+        }
+        return [
+            {'$match': match},
+            {'$unionWith': {'coll': BreachEventService.archive_collection_name, 'pipeline': [{'$match': match}]}},
+            {'$group': {
+                '_id': {'$toString': '$user_id'},
+                'count': {'$sum': 1},
+                'weight_sum': {'$sum': weight_by_severity},
+                **{f'severity_{severity}': {'$sum': {'$cond': [{'$eq': ['$severity', severity]}, 1, 0]}}
+                   for severity in weights},
+                **RiskDecay.aggregation_fields(weight_by_severity)
+            }}
+        ]
+
+    @classmethod
+    async def _rescore_chunk(cls, users: List[Dict[str, Any]]) -> int:
+        updated = 0
+        for _ in range(cls.MAX_CHUNK_ATTEMPTS):
+            modified, conflicts = await cls._rescore_users(users)
+            updated += modified
+            users = [user for user in users if user['_id'] in conflicts]
+            if not users:
+                return updated
+        Logger.error(f'Risk stats of {len(users)} users kept changing during the rescore, '
+                     f'first {users[0]["_id"]}; run it again for them')
+        return updated
+
+    @classmethod
+    async def _rescore_users(cls, users: List[Dict[str, Any]]) -> Tuple[int, Set[ObjectId]]:
+        """Rescore users once. Returns the number updated and the ids that changed meanwhile."""
+        from app.services.users.user_service import UserService
+        from app.services.users.events.breach_event_service import BreachEventService
+        from app.services.users.scoring.score_queue import RiskScoreQueue
+
+        # Events reference a user by passport string, ObjectId string or ObjectId
+        owner = {}
+        for user in users:
+            owner[str(user['_id'])] = user['_id']
+            if user.get('passport_string'):
+                owner[user['passport_string']] = user['_id']
+
+        # Queued deltas for these users would otherwise be applied on top of the fresh totals
+        await RiskScoreQueue.settle(owner)
+        read = {
+            user['_id']: user.get('risk_stats')
+            async for user in MongoDB.db[UserService.collection_name].find(
+                {'_id': {'$in': [user['_id'] for user in users]}}, {'risk_stats': 1}
+            )
+        }
+
+        severities = list(UserService.SEVERITY_WEIGHTS)
+        buckets = list(RiskDecay.buckets())
+        stats = {
+            user['_id']: {'count': 0, 'weight_sum': 0, 'severity': {severity: 0 for severity in severities},
+                          'decay': {bucket: 0 for bucket in buckets}}
+            for user in users
+        }
+        match = {'user_id': {'$in': list(owner) + [user['_id'] for user in users]}}
+        cursor = MongoDB.db[BreachEventService.collection_name].aggregate(cls._stats_pipeline(match))
+        async for row in cursor:
+            user_stats = stats[owner[row['_id']]]
+            user_stats['count'] += row['count']
+            user_stats['weight_sum'] += row['weight_sum']
+            for severity in severities:
+                user_stats['severity'][severity] += row[f'severity_{severity}']
+            for bucket in buckets:
+                user_stats['decay'][bucket] += row[f'decay_{bucket}']
+
+        # A delta queued during the aggregation may be for an event it already counted
+        conflicts = {owner[key] for key in owner
+                     if RiskScoreQueue.is_pending(key) or RiskScoreQueue.is_writing(key)}
+        # Users deleted since the chunk was listed are not in read and need no write
+        user_ids = [user_id for user_id in stats if user_id in read and user_id not in conflicts]
+        if not user_ids:
+            return 0, conflicts
+        result = await MongoDB.db[UserService.collection_name].bulk_write([
+            UpdateOne({'_id': user_id, 'risk_stats': read[user_id]},
+                      {'$set': {'risk_stats': stats[user_id], 'ref_score': UserService.ref_score_from_stats(stats[user_id])}})
+            for user_id in user_ids
+        ], ordered=False)
+        if result.matched_count < len(user_ids):
+            # Some writes found changed risk_stats and were skipped; those users are redone
+            conflicts |= {
+                user['_id'] async for user in MongoDB.db[UserService.collection_name].find(
+                    {'_id': {'$in': user_ids}}, {'risk_stats': 1}
+                ) if user.get('risk_stats') != stats[user['_id']]
+            }
+        return result.modified_count, conflicts
+
+    @classmethod
+    async def _run_claimed(cls, job: Dict[str, Any], chunk_size: int,
+                           progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        from app.services.users.user_service import UserService
+
+        jobs = MongoDB.db[cls.jobs_collection]
+        last_user_id = job.get('last_user_id')
+        try:
+            while True:
+                users = await MongoDB.db[UserService.collection_name].find(
+                    {'_id': {'$gt': last_user_id}} if last_user_id else {},
+                    {'passport_string': 1}
+                ).sort('_id', 1).limit(chunk_size).to_list(None)
+                if not users:
+                    break
+
+                updated = await cls._rescore_chunk(users)
+                last_user_id = users[-1]['_id']
+                job = await jobs.find_one_and_update(
+                    {'_id': cls.name},
+                    {'$set': {'last_user_id': last_user_id, 'updated_at': datetime.utcnow()},
+                     '$inc': {'processed': len(users), 'updated': updated, 'chunks': 1}},
+                    return_document=ReturnDocument.AFTER
+                )
+                if progress:
+                    progress(job)
+
+            job = await jobs.find_one_and_update(
+                {'_id': cls.name},
+                {'$set': {'status': 'completed', 'updated_at': datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER
+            )
+            Logger.info(f'Rescore completed: {job["processed"]} users, {job["updated"]} changed')
+            return job
+        except asyncio.CancelledError:
+            await jobs.update_one({'_id': cls.name}, {'$set': {'status': 'interrupted', 'updated_at': datetime.utcnow()}})
+            Logger.warning(f'Rescore interrupted after {job["processed"]} users, it will resume from there')
+            raise
+        except Exception as e:
+            await jobs.update_one({'_id': cls.name},
+                                  {'$set': {'status': 'failed', 'error': str(e), 'updated_at': datetime.utcnow()}})
+            Logger.error(f'Rescore failed after {job["processed"]} users: {str(e)}')
+            raise
+
+    @classmethod
+    async def run(cls, restart: bool = False, chunk_size: Optional[int] = None,
+                  progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Run the job to completion in the caller's task. Raises RescoreJobRunningError if it is already running."""
+        job = await cls._claim(restart)
+        return await cls._run_claimed(job, chunk_size or cls.CHUNK_SIZE, progress)
+
+    @classmethod
+    async def start(cls, restart: bool = False, chunk_size: Optional[int] = None) -> Dict[str, Any]:
+        """Claim the job and run it in the background of this process."""
+        job = await cls._claim(restart)
+        cls._task = asyncio.create_task(cls._run_claimed(job, chunk_size or cls.CHUNK_SIZE))
+        cls._task.add_done_callback(cls._task_done)
+        return await cls.status()
+
+    @classmethod
+    def _task_done(cls, task: asyncio.Task):
+        # Failures are already recorded on the job document; retrieve them so asyncio does not warn
+        if not task.cancelled():
+            task.exception()
+        if cls._task is task:
+            cls._task = None
+
+    @classmethod
+    async def cancel(cls):
+        """Stop a background run at shutdown. The checkpoint lets the next start resume it."""
+        task = cls._task
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
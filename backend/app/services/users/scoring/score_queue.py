@@ -0,0 +1,223 @@
+import asyncio
+import functools
+import os
+import time
+from typing import Any, Dict, Iterable, Optional, Set
+from dotenv import load_dotenv
+from app.utils.logger.logger import Logger
+
+load_dotenv()
+
+
+class RiskScoreQueue:
+    """In-process queue that applies risk_stats deltas off the request path.
+
+    Deltas for the same user are merged while they wait, so a burst of events for one
+    user becomes a single write. A user's delta is flushed once it has waited
+    DEBOUNCE_SECONDS, in batches of up to BATCH_SIZE users with at most MAX_CONCURRENCY
+    bulk writes in flight. Deltas still pending at shutdown are flushed by drain().
+    A crash loses pending deltas; `make rebuild-risk-stats` repairs the aggregates.
+    """
+    DEBOUNCE_SECONDS = float(os.getenv('RISK_SCORE_DEBOUNCE_SECONDS', '0.5'))
+    MAX_CONCURRENCY = int(os.getenv('RISK_SCORE_MAX_CONCURRENCY', '4'))
+    BATCH_SIZE = int(os.getenv('RISK_SCORE_BATCH_SIZE', '500'))
+
+    _pending: Dict[str, Dict[str, float]] = {}
+    _enqueued_at: Dict[str, float] = {}
+    _wakeup: Optional[asyncio.Event] = None
+    _worker: Optional[asyncio.Task] = None
+    _flushes: Set[asyncio.Task] = set()
+    # Flush tasks by the users in their batch, while the write is in flight
+    _writing: Dict[str, Set[asyncio.Task]] = {}
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _stopping = False
+
+    submitted = 0
+    coalesced = 0
+    flushed_users = 0
+    flush_batches = 0
+    failed_batches = 0
+    last_flush_lag_seconds = 0.0
+
+    @classmethod
+    def is_running(cls) -> bool:
+        return cls._worker is not None and not cls._worker.done() and not cls._stopping
+
+    @classmethod
+    def start(cls):
+        if cls.is_running():
+            return
+        cls._wakeup = asyncio.Event()
+        cls._semaphore = asyncio.Semaphore(cls.MAX_CONCURRENCY)
+        cls._stopping = False
+        cls._worker = asyncio.create_task(cls._run())
+        Logger.info('Risk score queue started')
+
+    @classmethod
+    async def submit(cls, user_id: str, delta: Dict[str, float]):
+        """Queue a delta for user_id. Falls back to a direct write when the worker is not running."""
+        from app.services.users.user_service import UserService
+
+        if not cls.is_running():
+            await UserService.apply_risk_delta(user_id, delta)
+            return
+
+        cls.submitted += 1
+        if user_id in cls._pending:
+            cls.coalesced += 1
+            cls._pending[user_id] = UserService.merge_risk_deltas(cls._pending[user_id], delta)
+            return
+
+        cls._pending[user_id] = dict(delta)
+        cls._enqueued_at[user_id] = time.monotonic()
+        if len(cls._pending) == 1:
+            cls._wakeup.set()
+
+    @classmethod
+    async def submit_many(cls, deltas: Dict[str, Dict[str, float]]):
+        from app.services.users.user_service import UserService
+
+        if not cls.is_running():
+            await UserService.apply_risk_deltas(deltas)
+            return
+        for user_id, delta in deltas.items():
+            await cls.submit(user_id, delta)
+
+    @classmethod
+    def is_pending(cls, user_id: str) -> bool:
+        return user_id in cls._pending
+
+    @classmethod
+    def is_writing(cls, user_id: str) -> bool:
+        return user_id in cls._writing
+
+    @classmethod
+    async def flush_user(cls, user_id: str):
+        """Write a user's pending delta now, e.g. before serving a read of their score."""
+        if user_id not in cls._pending:
+            return
+        await cls._start_flush(cls._take([user_id]))
+
+    @classmethod
+    async def settle(cls, user_ids: Iterable[str]):
+        """Write the pending deltas of user_ids now and wait for writes of theirs already in flight."""
+        user_ids = list(user_ids)
+        pending = [user_id for user_id in user_ids if user_id in cls._pending]
+        if pending:
+            await cls._start_flush(cls._take(pending))
+        writing = {task for user_id in user_ids for task in cls._writing.get(user_id, ())}
+        if writing:
+            await asyncio.gather(*writing, return_exceptions=True)
+
+    @classmethod
+    def _take(cls, user_ids) -> Dict[str, Dict[str, float]]:
+        now = time.monotonic()
+        batch = {}
+        for user_id in user_ids:
+            batch[user_id] = cls._pending.pop(user_id)
+            cls.last_flush_lag_seconds = max(0.0, now - cls._enqueued_at.pop(user_id))
+        return batch
+
+    @classmethod
+    def _due_users(cls):
+        # _enqueued_at keeps first-submit order, so the oldest users come first
+        deadline = time.monotonic() - cls.DEBOUNCE_SECONDS
+        due = []
+        for user_id, enqueued_at in cls._enqueued_at.items():
+            if len(due) >= cls.BATCH_SIZE or (enqueued_at > deadline and not cls._stopping):
+                break
+            due.append(user_id)
+        return due
+
+    @classmethod
+    async def _run(cls):
+        while True:
+            if not cls._pending:
+                if cls._stopping:
+                    return
+                cls._wakeup.clear()
+                await cls._wakeup.wait()
+                continue
+
+            due = cls._due_users()
+            if not due:
+                oldest = next(iter(cls._enqueued_at.values()))
+                cls._wakeup.clear()
+                try:
+                    # Sleep until the oldest entry is due, or until drain() wakes us early
+                    await asyncio.wait_for(cls._wakeup.wait(), oldest + cls.DEBOUNCE_SECONDS - time.monotonic())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await cls._semaphore.acquire()
+            task = cls._start_flush(cls._take(due))
+            cls._flushes.add(task)
+            task.add_done_callback(cls._flush_done)
+
+    @classmethod
+    def _start_flush(cls, batch: Dict[str, Dict[str, float]]) -> asyncio.Task:
+        task = asyncio.create_task(cls._flush(batch))
+        for user_id in batch:
+            cls._writing.setdefault(user_id, set()).add(task)
+        task.add_done_callback(functools.partial(cls._written, list(batch)))
+        return task
+
+    @classmethod
+    def _written(cls, user_ids, task: asyncio.Task):
+        for user_id in user_ids:
+            tasks = cls._writing.get(user_id)
+            if tasks is not None:
+                tasks.discard(task)
+                if not tasks:
+                    del cls._writing[user_id]
+
+    @classmethod
+    def _flush_done(cls, task: asyncio.Task):
+        cls._flushes.discard(task)
+        cls._semaphore.release()
+
+    @classmethod
+    async def _flush(cls, batch: Dict[str, Dict[str, float]]):
+        from app.services.users.user_service import UserService
+
+        if await UserService.apply_risk_deltas(batch) is None:
+            cls.failed_batches += 1
+            Logger.error(f'Dropped risk score deltas for {len(batch)} users, run rebuild-risk-stats to repair')
+            return
+        cls.flushed_users += len(batch)
+        cls.flush_batches += 1
+
+    @classmethod
+    async def drain(cls):
+        """Flush everything still pending and stop the worker. Called on shutdown."""
+        if cls._worker is None:
+            return
+        cls._stopping = True
+        cls._wakeup.set()
+        await cls._worker
+        if cls._flushes:
+            await asyncio.gather(*cls._flushes, return_exceptions=True)
+        cls._worker = None
+        Logger.info(f'Risk score queue drained, {cls.flushed_users} users flushed in total')
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        oldest = next(iter(cls._enqueued_at.values()), None)
+        return {
+            'running': cls.is_running(),
+            'depth': len(cls._pending),
+            'oldest_pending_seconds': round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+            'last_flush_lag_seconds': round(cls.last_flush_lag_seconds, 3),
+            'in_flight_batches': len(cls._flushes),
+            'submitted': cls.submitted,
+            'coalesced': cls.coalesced,
+            'flushed_users': cls.flushed_users,
+            'flush_batches': cls.flush_batches,
+            'failed_batches': cls.failed_batches,
+            'settings': {
+                'debounce_seconds': cls.DEBOUNCE_SECONDS,
+                'max_concurrency': cls.MAX_CONCURRENCY,
+                'batch_size': cls.BATCH_SIZE
+            }
+        }
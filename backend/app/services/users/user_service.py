@@ -2,12 +2,34 @@ from app.models.user.user import User
 from app.utils.logger.logger import Logger
 from app.core.db.db import MongoDB
 from app.services.users.info.user_info import UserInfoService
-from app.services.users.events.breach_event_service import BreachEventService
-from typing import Optional, List
+from app.services.users.scoring.score_queue import RiskScoreQueue
+from app.services.users.scoring.decay import RiskDecay
+from typing import Optional, List, Dict
+from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# ref_score is the mean severity weight of the user's events, as a 0-100 integer
+REF_SCORE_EXPR = {
+    '$cond': [
+        {'$gt': [{'$ifNull': ['$risk_stats.count', 0]}, 0]},
+        {'$toInt': {'$trunc': {'$multiply': [{'$divide': ['$risk_stats.weight_sum', '$risk_stats.count']}, 100]}}},
+        0
+    ]
+}
 
 class UserService:
     collection_name = 'users'
+    # Maintained from the user's breach events, never taken from a request body
+    DERIVED_FIELDS = {'ref_score', 'risk_stats'}
+
+    SEVERITY_WEIGHTS = {
+        'LOW': 0.25,
+        'MEDIUM': 0.5,
+        'HIGH': 0.75,
+        'CRITICAL': 1.0
+    }
 
     @classmethod
     async def check_if_record_exists(cls, passport_string: str) -> bool:
@@ -22,28 +44,23 @@ class UserService:
     async def create_user(cls, user: User, ip_address: str) -> Optional[User]:
         try:
             Logger.info(f'Creating user with passport_string: {user.passport_string}')
-            existing_user = await cls.get_user(user.passport_string)
-            if existing_user:
-                Logger.info(f'User already exists with passport_string: {user.passport_string}')
-                await UserInfoService.add_device(str(existing_user.id), ip_address)
-                return existing_user
-
-            user_dict = user.model_dump(exclude={'id'})
-            Logger.info(f'Creating new user with data: {user_dict}')
+            user_dict = user.model_dump(exclude={'id', 'passport_string', *cls.DERIVED_FIELDS})
+            # A new user has no events yet, whatever score the request carried
+            user_dict['ref_score'] = 0
+            # Insert-if-absent and read back in one round trip; the unique passport_string
+            # index makes this safe against concurrent creates.
             try:
-                result = await MongoDB.db[cls.collection_name].insert_one(user_dict)
-            except Exception as e:
-                if 'duplicate key error' in str(e):
-                    Logger.info(f'Duplicate key detected, fetching existing user')
-                    existing_user = await cls.get_user(user.passport_string)
-                    if existing_user:
-                        await UserInfoService.add_device(str(existing_user.id), ip_address)
-                        return existing_user
-                raise
-
-            created_user_dict = await MongoDB.db[cls.collection_name].find_one(
-                {'_id': result.inserted_id}
-            )
+                created_user_dict = await MongoDB.db[cls.collection_name].find_one_and_update(
+                    {'passport_string': user.passport_string},
+                    {'$setOnInsert': user_dict},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                Logger.info(f'Duplicate key detected, fetching existing user')
+                created_user_dict = await MongoDB.db[cls.collection_name].find_one(
+                    {'passport_string': user.passport_string}
+                )
             if not created_user_dict:
                 Logger.error('Failed to find created user')
                 return None
@@ -102,17 +119,12 @@ class UserService:
     @classmethod
     async def update_user(cls, passport_string: str, user: User, ip_address: Optional[str] = None) -> Optional[User]:
         try:
-            user_data = await MongoDB.db[cls.collection_name].find_one({'passport_string': passport_string})
-            if not user_data:
-                return None
-            if '_id' in user_data:
-                user_data['_id'] = str(user_data['_id'])
-            update_data = user.model_dump(exclude={'id', 'passport_string'})
-            await MongoDB.db[cls.collection_name].update_one(
+            update_data = user.model_dump(exclude={'id', 'passport_string', *cls.DERIVED_FIELDS})
+            updated_user_data = await MongoDB.db[cls.collection_name].find_one_and_update(
                 {'passport_string': passport_string},
-                {'$set': update_data}
+                {'$set': update_data},
+                return_document=ReturnDocument.AFTER
             )
-            updated_user_data = await MongoDB.db[cls.collection_name].find_one({'passport_string': passport_string})
             if not updated_user_data:
                 return None
             if '_id' in updated_user_data:
@@ -181,35 +193,125 @@ class UserService:
             return None
 
     @classmethod
-    async def set_user_risk_score(cls, user_id: str) -> Optional[dict[str, any]]:
-        try:
-            user = await cls.get_user_by_id(user_id)
-            if not user:
-                return {"ref_score": 0}
+    def risk_delta(cls, severity: str, sign: int = 1, breach_type: Optional[str] = None,
+                   timestamp: Optional[datetime] = None) -> Dict[str, float]:
+        """Change to a user's risk_stats caused by adding (sign=1) or removing (sign=-1) one event."""
+        severity = getattr(severity, 'value', severity) or 'LOW'
+        weight = cls.SEVERITY_WEIGHTS.get(severity, 0.25)
+        delta = {'count': sign, 'weight_sum': sign * weight}
+        if severity in cls.SEVERITY_WEIGHTS:
+            delta[f'severity.{severity}'] = sign
+        delta.update(RiskDecay.contribution(weight, severity, breach_type, timestamp, sign))
+        return delta
 
-            breach_events = await BreachEventService.get_user_breach_events(user_id)
+    @classmethod
+    def event_risk_delta(cls, event: dict, sign: int = 1) -> Dict[str, float]:
+        return cls.risk_delta(event.get('severity'), sign, event.get('breach_type'), event.get('timestamp'))
 
-            severity_weights = {
-                'LOW': 0.25,
-                'MEDIUM': 0.5,
-                'HIGH': 0.75,
-                'CRITICAL': 1.0
-            }
+    @staticmethod
+    def merge_risk_deltas(*deltas: Dict[str, float]) -> Dict[str, float]:
+        merged = {}
+        for delta in deltas:
+            for path, value in delta.items():
+                merged[path] = merged.get(path, 0) + value
+        return merged
+
+    @staticmethod
+    def ref_score_from_stats(stats: Optional[dict]) -> int:
+        if not stats or stats.get('count', 0) <= 0:
+            return 0
+        return int(stats['weight_sum'] / stats['count'] * 100)
+
+    @classmethod
+    def _risk_delta_pipeline(cls, delta: Dict[str, float]) -> List[dict]:
+        """Update pipeline that applies delta to risk_stats and re-derives ref_score in one write."""
+        increments = {
+            f'risk_stats.{path}': {'$add': [{'$ifNull': [f'$risk_stats.{path}', 0]}, value]}
+            for path, value in delta.items()
+        }
+        return [{'$set': increments}, {'$set': {'ref_score': REF_SCORE_EXPR}}]
+
+    @classmethod
+    async def apply_risk_delta(cls, user_id: str, delta: Dict[str, float]) -> Optional[int]:
+        """Apply one event's contribution to the user's running aggregates. O(1) in the user's history."""
+        try:
+            user = await MongoDB.db[cls.collection_name].find_one_and_update(
+                cls._user_filter(user_id),
+                cls._risk_delta_pipeline(delta),
+                projection={'ref_score': 1},
+                return_document=ReturnDocument.AFTER
+            )
+            return user.get('ref_score', 0) if user else None
+        except Exception as e:
+            Logger.error(f"Error updating risk stats for user {user_id}: {str(e)}")
+            return None
 
-            total_weight = 0
-            for event in breach_events:
-                severity = event.get('severity', 'LOW')
-                weight = severity_weights.get(severity, 0.25)
-                total_weight += weight
+    @classmethod
+    async def apply_risk_deltas(cls, deltas: Dict[str, Dict[str, float]]) -> Optional[int]:
+        """Apply pre-merged deltas for many users with a single bulk_write. Returns None on failure."""
+        if not deltas:
+            return 0
+        try:
+            result = await MongoDB.db[cls.collection_name].bulk_write(
+                [UpdateOne(cls._user_filter(uid), cls._risk_delta_pipeline(delta)) for uid, delta in deltas.items()],
+                ordered=False
+            )
+            return result.modified_count
+        except Exception as e:
+            Logger.error(f"Error updating risk stats for {len(deltas)} users: {str(e)}")
+            return None
 
-            num_events = len(breach_events)
-            new_score = total_weight / (num_events * 1.0) if num_events > 0 else 0
+    @classmethod
+    async def get_scores(cls, user_id: str) -> Optional[dict]:
+        """Stored scores of a user given their passport string or ObjectId string, None if there is no such user.
 
-            user.ref_score = int(new_score * 100)
-            await cls.update_user(user.passport_string, user)
+        risk_stats are maintained on every event write, so this is one indexed read; the
+        time-decayed score is derived from it for the current time. Deltas still waiting in
+        the score queue for the user are written first so the read sees them.
+        """
+        projection = {'ref_score': 1, 'passport_string': 1, 'risk_stats.decay': 1}
+        try:
+            await RiskScoreQueue.flush_user(user_id)
+            user = await MongoDB.db[cls.collection_name].find_one(cls._user_filter(user_id), projection)
+            if not user:
+                return None
+            # Events may reference the user by the other identifier
+            other_id = str(user['_id']) if user.get('passport_string') == user_id else user.get('passport_string')
+            if other_id and RiskScoreQueue.is_pending(other_id):
+                await RiskScoreQueue.flush_user(other_id)
+                user = await MongoDB.db[cls.collection_name].find_one({'_id': user['_id']}, projection)
+            if not user:
+                return None
+            decayed_weight = RiskDecay.decayed_weight(user.get('risk_stats', {}).get('decay'))
+            return {
+                'ref_score': user.get('ref_score', 0),
+                'decayed_score': RiskDecay.score(decayed_weight),
+                'decayed_weight': round(decayed_weight, 4)
+            }
+        except Exception as e:
+            Logger.error(f"Error getting scores for user {user_id}: {str(e)}")
+            raise
 
-            return {"ref_score": user.ref_score}
+    @classmethod
+    async def set_user_risk_score(cls, user_id: str) -> Optional[dict[str, any]]:
+        try:
+            user = await MongoDB.db[cls.collection_name].find_one_and_update(
+                cls._user_filter(user_id),
+                [{'$set': {'ref_score': REF_SCORE_EXPR}}],
+                projection={'ref_score': 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if not user:
+                return {"ref_score": 0}
+            return {"ref_score": user.get('ref_score', 0)}
 
         except Exception as e:
             Logger.error(f"Error setting user risk score: {str(e)}")
             return {"ref_score": 0}
+
+    @staticmethod
+    def _user_filter(user_id: str) -> dict:
+        # Events reference users by passport string or by ObjectId string
+        if ObjectId.is_valid(user_id):
+            return {'$or': [{'passport_string': user_id}, {'_id': ObjectId(user_id)}]}
+        return {'passport_string': user_id}
@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+MISSING = object()
+
+
+class TTLCache:
+    """Bounded in-process cache with per-entry expiry and least-recently-used eviction.
+
+    Values may be None, which lets callers cache negative lookups; get() returns
+    MISSING when there is no live entry. Every cache registers itself by name so
+    its counters can be reported from one place.
+    """
+    registry: Dict[str, 'TTLCache'] = {}
+
+    def __init__(self, name: str, ttl_seconds: float, max_size: int = 1024):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        TTLCache.registry[name] = self
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        if self._entries.pop(key, None) is None:
+            return False
+        self.invalidations += 1
+        return True
+
+    def clear(self) -> int:
+        count = len(self._entries)
+        self._entries.clear()
+        self.invalidations += count
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
+
+    @classmethod
+    def all_stats(cls) -> Dict[str, Dict[str, Any]]:
+        return {name: cache.stats() for name, cache in cls.registry.items()}
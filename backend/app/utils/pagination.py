@@ -0,0 +1,58 @@
+import base64
+import heapq
+import json
+from itertools import islice
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import DESCENDING
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def keyset_sort(direction: int = DESCENDING) -> List[Tuple[str, int]]:
+    return [('timestamp', direction), ('_id', direction)]
+
+
+def encode_cursor(timestamp: datetime, object_id: Any) -> str:
+    """Build an opaque token pointing just past the given (timestamp, _id) position."""
+    payload = json.dumps({'t': timestamp.isoformat(), 'id': str(object_id)})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(payload['t']), ObjectId(payload['id'])
+    except Exception:
+        raise ValueError('Invalid pagination cursor')
+
+
+def keyset_filter(query: Dict[str, Any], cursor: Optional[str], direction: int = DESCENDING) -> Dict[str, Any]:
+    """Restrict query to documents after the cursor position in (timestamp, _id) order."""
+    if not cursor:
+        return query
+    timestamp, object_id = decode_cursor(cursor)
+    op = '$lt' if direction == DESCENDING else '$gt'
+    after = {'$or': [
+        {'timestamp': {op: timestamp}},
+        {'timestamp': timestamp, '_id': {op: object_id}}
+    ]}
+    return {'$and': [query, after]} if query else after
+
+
+def merge_pages(pages: List[List[Dict[str, Any]]], direction: int = DESCENDING,
+                limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Merge pages that are each already in keyset order, e.g. from several collections."""
+    merged = heapq.merge(*pages, key=lambda doc: (doc['timestamp'], doc['_id']), reverse=direction == DESCENDING)
+    return list(islice(merged, limit))
+
+
+def next_cursor(page: List[Dict[str, Any]], limit: Optional[int]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Trim a page fetched with limit + 1 documents and return it with the cursor for the next page."""
+    if limit is None or len(page) <= limit:
+        return page, None
+    page = page[:limit]
+    last = page[-1]
+    return page, encode_cursor(last['timestamp'], last['_id'])
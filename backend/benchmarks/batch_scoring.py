@@ -0,0 +1,66 @@
+"""Compare the scalar and vectorised risk scorers on synthetic breach events.
+
+No database needed. Checks that both produce the same scores before timing them.
+
+    PYTHONPATH=. python benchmarks/batch_scoring.py --events 10000 100000 1000000
+"""
+import argparse
+import time
+import numpy as np
+from app.services.users.scoring.scoring import (
+    SEVERITY_LEVELS, calculate_risk_score, calculate_risk_scores, calculate_risk_scores_by_user
+)
+
+EVENTS_PER_USER = 10
+COMPANIES = 500
+
+
+def synthetic_events(n_events: int, rng: np.random.Generator):
+    n_users = max(1, n_events // EVENTS_PER_USER)
+    user_index = rng.integers(0, n_users, n_events)
+    severity_code = rng.choice(len(SEVERITY_LEVELS), n_events, p=[0.4, 0.3, 0.2, 0.1])
+    company_code = rng.integers(0, COMPANIES, n_events)
+    num_devices = rng.integers(0, 5, n_users)
+
+    events_by_user = {f'U{i}': [] for i in range(n_users)}
+    for user, severity, company in zip(user_index.tolist(), severity_code.tolist(), company_code.tolist()):
+        events_by_user[f'U{user}'].append({'severity': SEVERITY_LEVELS[severity], 'company_id': f'C{company}'})
+    devices_by_user = {f'U{i}': int(d) for i, d in enumerate(num_devices)}
+    return (user_index, severity_code, company_code, num_devices), events_by_user, devices_by_user
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run(n_events: int, rng: np.random.Generator):
+    columns, events_by_user, devices_by_user = synthetic_events(n_events, rng)
+
+    scalar, scalar_s = timed(lambda: {
+        user_id: calculate_risk_score(user_id, events, devices_by_user[user_id])
+        for user_id, events in events_by_user.items()
+    })
+    batch, batch_s = timed(lambda: calculate_risk_scores(*columns))
+    by_user, by_user_s = timed(lambda: calculate_risk_scores_by_user(events_by_user, devices_by_user))
+
+    expected = np.array([scalar[f'U{i}'] for i in range(len(batch))])
+    if not np.array_equal(expected, batch) or by_user != scalar:
+        mismatch = np.max(np.abs(expected - batch))
+        raise SystemExit(f'Batch scores differ from the scalar scorer (max abs diff {mismatch})')
+
+    print(f'{n_events:>9} events {len(batch):>7} users  '
+          f'scalar {scalar_s * 1000:>9.1f} ms  '
+          f'columns {batch_s * 1000:>7.1f} ms ({scalar_s / batch_s:>6.1f}x)  '
+          f'dicts {by_user_s * 1000:>8.1f} ms ({scalar_s / by_user_s:>5.1f}x)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--seed', type=int, default=15)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    for n_events in args.events:
+        run(n_events, rng)
@@ -0,0 +1,98 @@
+"""Per-lookup latency of IP reputation calls with a session per call vs the shared HTTPClient.
+
+Starts a local stub of the IPQualityScore endpoint and points IPCheckService at it, so no
+API key or network is needed. The stub counts the TCP connections it accepts. Against the
+real provider the gap is wider, since every new connection there also costs DNS and TLS.
+
+    PYTHONPATH=. python benchmarks/http_client.py --lookups 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import time
+import aiohttp
+from aiohttp import web
+import numpy as np
+from app.core.http.client import HTTPClient
+from app.services.users.info.ipcheck import IPCheckService
+
+STUB_RESPONSE = {'success': True, 'fraud_score': 42, 'vpn': False, 'proxy': False, 'tor': False,
+                 'datacenter': False, 'country_code': 'IE', 'city': 'Dublin'}
+
+
+async def start_stub(delay_ms: float):
+    connections = set()
+
+    async def lookup(request):
+        connections.add(request.transport)
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+        return web.json_response(STUB_RESPONSE)
+
+    app = web.Application()
+    app.router.add_get('/api/json/ip/{key}/{ip}', lookup)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}/api/json/ip', connections
+
+
+async def per_call_session(ip_address: str):
+    # What check_ip did before the shared client: a new session, connector and connection each time
+    async with aiohttp.ClientSession() as session:
+        url = f'{IPCheckService.IPQUALITYSCORE_URL}/{IPCheckService.IPQUALITYSCORE_API_KEY}/{ip_address}'
+        async with session.get(url) as response:
+            return await response.json()
+
+
+async def shared_session(ip_address: str):
+    result, ok = await IPCheckService._lookup(ip_address)
+    if not ok:
+        raise RuntimeError(f'Lookup for {ip_address} failed')
+    return result
+
+
+async def measure(name, lookup, lookups, concurrency, connections):
+    connections.clear()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter_ns()
+            await lookup(f'8.8.{i // 256 % 256}.{i % 256}')
+            latencies.append(time.perf_counter_ns() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(lookups)))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) / 1e6
+    print(f'{name:<22}{concurrency:>6}{np.mean(ms):>10.3f}{np.percentile(ms, 50):>10.3f}'
+          f'{np.percentile(ms, 99):>10.3f}{lookups / elapsed:>12.1f}{len(connections):>8}')
+    return float(np.mean(ms))
+
+
+async def main(lookups: int, concurrency: int, delay_ms: float):
+    runner, url, connections = await start_stub(delay_ms)
+    IPCheckService.IPQUALITYSCORE_URL = url
+    IPCheckService.IPQUALITYSCORE_API_KEY = 'bench'
+    try:
+        print(f'{lookups} lookups, stub delay {delay_ms} ms')
+        print(f'{"client":<22}{"conc":>6}{"mean ms":>10}{"p50 ms":>10}{"p99 ms":>10}{"lookups/s":>12}{"conns":>8}')
+        for level in sorted({1, concurrency}):
+            before = await measure('session per call', per_call_session, lookups, level, connections)
+            after = await measure('shared HTTPClient', shared_session, lookups, level, connections)
+            print(f'{"":<22}{"":>6}  {before / after:.1f}x lower mean latency')
+    finally:
+        await HTTPClient.close()
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lookups', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--delay-ms', type=float, default=0.0, help='server-side processing time per lookup')
+    args = parser.parse_args()
+    asyncio.run(main(args.lookups, args.concurrency, args.delay_ms))
@@ -0,0 +1,89 @@
+"""Build time and lookup latency of the provider range index at provider-list scale.
+
+Generates random IPv4 and IPv6 prefixes (including nested ones, as in real provider
+files), then times lookups against the compiled index and against a linear scan of
+ipaddress networks, which is what IPCheckService did before.
+
+    PYTHONPATH=. python benchmarks/provider_ranges.py --prefixes 100000
+"""
+import argparse
+import ipaddress
+import random
+import time
+from app.services.users.info.provider_ranges import RangeIndex
+
+
+def synthetic_ranges(count: int, ipv6_share: float, rng: random.Random):
+    ranges = []
+    for i in range(count):
+        provider = f'provider{i % 20}'
+        if rng.random() < ipv6_share:
+            address = rng.getrandbits(128)
+            ranges.append((ipaddress.IPv6Network((address, rng.randint(32, 64)), strict=False), provider))
+        else:
+            address = rng.getrandbits(32)
+            ranges.append((ipaddress.IPv4Network((address, rng.randint(12, 28)), strict=False), provider))
+    return ranges
+
+
+def sample_addresses(ranges, count: int, rng: random.Random):
+    # Half inside some range, half anywhere, in both families
+    addresses = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            network, _ = rng.choice(ranges)
+            addresses.append(str(network.network_address + rng.randrange(network.num_addresses)))
+        elif rng.random() < 0.5:
+            addresses.append(str(ipaddress.IPv4Address(rng.getrandbits(32))))
+        else:
+            addresses.append(str(ipaddress.IPv6Address(rng.getrandbits(128))))
+    return addresses
+
+
+def time_per_call(fn, addresses) -> float:
+    start = time.perf_counter()
+    for address in addresses:
+        fn(address)
+    return (time.perf_counter() - start) / len(addresses) * 1e6
+
+
+def main(prefixes: int, lookups: int, linear_lookups: int, ipv6_share: float, seed: int):
+    rng = random.Random(seed)
+    ranges = synthetic_ranges(prefixes, ipv6_share, rng)
+
+    start = time.perf_counter()
+    index = RangeIndex(ranges)
+    build_s = time.perf_counter() - start
+    print(f'{prefixes} prefixes ({ipv6_share:.0%} IPv6), built in {build_s:.2f} s: {index.stats()}')
+
+    addresses = sample_addresses(ranges, lookups, rng)
+    parsed = [ipaddress.ip_address(address) for address in addresses]
+    hits = sum(index.lookup(ip) is not None for ip in parsed)
+
+    parse_us = time_per_call(ipaddress.ip_address, addresses)
+    index_us = time_per_call(index.lookup, parsed)
+    print(f'{"method":<34}{"us per lookup":>14}')
+    print(f'{"parse address":<34}{parse_us:>14.3f}')
+    print(f'{"index lookup (parsed)":<34}{index_us:>14.3f}')
+    print(f'{"parse + index lookup":<34}{parse_us + index_us:>14.3f}   {hits}/{lookups} matched')
+
+    def linear(ip):
+        for network, provider in ranges:
+            if ip.version == network.version and ip in network:
+                return provider
+        return None
+
+    linear_us = time_per_call(linear, parsed[:linear_lookups])
+    print(f'{"linear scan (parsed)":<34}{linear_us:>14.3f}   {linear_us / index_us:.0f}x slower, '
+          f'{linear_lookups} lookups')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prefixes', type=int, default=100_000)
+    parser.add_argument('--lookups', type=int, default=200_000)
+    parser.add_argument('--linear-lookups', type=int, default=50)
+    parser.add_argument('--ipv6-share', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=23)
+    args = parser.parse_args()
+    main(args.prefixes, args.lookups, args.linear_lookups, args.ipv6_share, args.seed)
@@ -0,0 +1,283 @@
+"""Benchmark every risk scorer on synthetic event histories and emit machine-readable results.
+
+Events per user follow a power law (most users have a handful, a few have thousands), so
+tail latencies reflect heavy users. Measured:
+
+  * utils.calculate_risk_score       - legacy scorer in app/utils/scoring, recomputed from history
+  * scoring.calculate_risk_score     - scalar scorer in app/services/users/scoring, from history
+  * scoring.calculate_risk_scores    - vectorised batch scorer, one call for every user
+  * risk_stats.update / .read        - the stored severity average and decayed score that
+                                       UserService maintains per event and serves on read
+  * e2e.direct / e2e.queued          - insert event -> score updated, against MongoDB (--mongo)
+
+    PYTHONPATH=. python benchmarks/scoring_suite.py --users 2000 --output results.json
+    PYTHONPATH=. python benchmarks/scoring_suite.py --compare before.json --output after.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from app.utils.scoring import scoring as legacy_scoring
+from app.services.users.scoring import scoring
+from app.services.users.scoring.decay import RiskDecay
+from app.services.users.user_service import UserService
+
+BENCH_DB = 'team15_bench'
+SEVERITIES = ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']
+SEVERITY_P = [0.45, 0.3, 0.18, 0.07]
+BREACH_TYPES = ['VIOLATING_TERMS', 'FRAUD', 'DEFAULT', 'SUSPICIOUS_ACTIVITY', 'ILLEGAL_ACTIVITY', 'DATA_LEAK']
+# The legacy scorer keys on these event_type strings
+LEGACY_EVENT_TYPES = {
+    'VIOLATING_TERMS': 'violating terms', 'FRAUD': 'fraud', 'DEFAULT': 'default',
+    'SUSPICIOUS_ACTIVITY': 'suspicious_activity', 'ILLEGAL_ACTIVITY': 'illegal_activity', 'DATA_LEAK': 'data_leak'
+}
+
+
+def synthetic_histories(n_users: int, zipf_a: float, max_events: int, companies: int,
+                        rng: np.random.Generator) -> Dict[str, List[Dict[str, Any]]]:
+    counts = np.minimum(rng.zipf(zipf_a, n_users), max_events)
+    now = datetime.now()
+    histories = {}
+    for user, count in enumerate(counts.tolist()):
+        severity = rng.choice(len(SEVERITIES), count, p=SEVERITY_P)
+        breach_type = rng.integers(0, len(BREACH_TYPES), count)
+        company = rng.zipf(1.5, count) % companies
+        age_days = rng.exponential(120, count)
+        histories[f'U{user}'] = [
+            {
+                'user_id': f'U{user}',
+                'severity': SEVERITIES[s],
+                'breach_type': BREACH_TYPES[b],
+                'event_type': LEGACY_EVENT_TYPES[BREACH_TYPES[b]],
+                'company_id': f'C{c}',
+                'timestamp': now - timedelta(days=float(a))
+            }
+            for s, b, c, a in zip(severity.tolist(), breach_type.tolist(), company.tolist(), age_days.tolist())
+        ]
+    return histories
+
+
+def summarize(name: str, latencies_ns: List[int], items: int, unit: str) -> Dict[str, Any]:
+    """Latency percentiles per call plus throughput in `unit`s (events, users) per second."""
+    latencies = np.array(latencies_ns, dtype=np.float64) / 1000
+    total_s = latencies.sum() / 1e6
+    return {
+        'name': name,
+        'calls': len(latencies_ns),
+        'items': items,
+        'unit': unit,
+        'mean_us': round(float(latencies.mean()), 3),
+        'p50_us': round(float(np.percentile(latencies, 50)), 3),
+        'p95_us': round(float(np.percentile(latencies, 95)), 3),
+        'p99_us': round(float(np.percentile(latencies, 99)), 3),
+        'max_us': round(float(latencies.max()), 3),
+        'throughput_per_s': round(items / total_s, 1) if total_s else None
+    }
+
+
+def time_calls(calls: List[Callable[[], Any]]) -> List[int]:
+    latencies = []
+    for call in calls:
+        start = time.perf_counter_ns()
+        call()
+        latencies.append(time.perf_counter_ns() - start)
+    return latencies
+
+
+def bench_in_process(histories: Dict[str, List[Dict[str, Any]]], devices: Dict[str, int],
+                     repeat: int) -> List[Dict[str, Any]]:
+    results = []
+    n_events = sum(len(events) for events in histories.values())
+    users = list(histories.items()) * repeat
+
+    results.append(summarize('utils.calculate_risk_score', time_calls([
+        (lambda uid=uid, events=events: legacy_scoring.calculate_risk_score(uid, events, devices[uid]))
+        for uid, events in users
+    ]), n_events * repeat, 'events'))
+
+    results.append(summarize('scoring.calculate_risk_score', time_calls([
+        (lambda uid=uid, events=events: scoring.calculate_risk_score(uid, events, devices[uid]))
+        for uid, events in users
+    ]), n_events * repeat, 'events'))
+
+    # One batch call covers every user; encoding the dicts into columns is timed separately
+    user_ids, user_index, severity_code, company_code = scoring.encode_breach_events(histories)
+    num_devices = np.array([devices[uid] for uid in user_ids])
+    results.append(summarize('scoring.encode_breach_events', time_calls(
+        [lambda: scoring.encode_breach_events(histories)] * repeat
+    ), n_events * repeat, 'events'))
+    results.append(summarize('scoring.calculate_risk_scores', time_calls(
+        [lambda: scoring.calculate_risk_scores(user_index, severity_code, company_code, num_devices)] * repeat
+    ), n_events * repeat, 'events'))
+
+    # What UserService does per event write, and per score read
+    events = [event for _, history in users for event in history]
+    results.append(summarize('risk_stats.update', time_calls([
+        (lambda event=event: UserService.event_risk_delta(event)) for event in events
+    ]), len(events), 'events'))
+
+    stats = {}
+    for uid, history in histories.items():
+        delta = UserService.merge_risk_deltas(*(UserService.event_risk_delta(event) for event in history))
+        stats[uid] = {
+            'count': delta.get('count', 0),
+            'weight_sum': delta.get('weight_sum', 0),
+            'decay': {path.split('.', 1)[1]: value for path, value in delta.items() if path.startswith('decay.')}
+        }
+
+    def read(uid):
+        UserService.ref_score_from_stats(stats[uid])
+        RiskDecay.score(RiskDecay.decayed_weight(stats[uid]['decay']))
+
+    results.append(summarize('risk_stats.read', time_calls([
+        (lambda uid=uid: read(uid)) for uid, _ in users
+    ]), len(users), 'users'))
+    return results
+
+
+async def bench_end_to_end(histories: Dict[str, List[Dict[str, Any]]], n_events: int,
+                           debounce_seconds: float) -> List[Dict[str, Any]]:
+    from app.core.db.db import MongoDB
+    from app.core.db.indexes import ensure_indexes
+    from app.models.user.user import User
+    from app.services.users.events.breach_event_service import BreachEventService
+    from app.services.users.scoring.score_queue import RiskScoreQueue
+
+    await MongoDB.initialize(BENCH_DB)
+    if MongoDB.db is None:
+        raise SystemExit('MongoDB is not reachable, set MONGODB_URL or drop --mongo')
+    await MongoDB.client.drop_database(BENCH_DB)
+    results = []
+    try:
+        await ensure_indexes(MongoDB.db)
+        events = [event for history in histories.values() for event in history][:n_events]
+        for uid in {event['user_id'] for event in events}:
+            await UserService.create_user(User(name='Bench User', passport_string=uid), '127.0.0.1')
+
+        def document(event):
+            return {key: value for key, value in event.items() if key != 'event_type'} | {
+                'status': 'OPEN', 'description': 'bench', 'timestamp': datetime.now()
+            }
+
+        # Queue stopped: the score write happens inline, so the insert returning means the score is updated
+        latencies = []
+        for event in events:
+            start = time.perf_counter_ns()
+            await BreachEventService.create_breach_event(document(event))
+            latencies.append(time.perf_counter_ns() - start)
+        results.append(summarize('e2e.direct', latencies, len(events), 'events'))
+
+        # Queue running: time until the user's coalesced delta has been written. A delta leaves
+        # the pending set when its flush starts, so also wait for that write to finish
+        RiskScoreQueue.DEBOUNCE_SECONDS = debounce_seconds
+        RiskScoreQueue.start()
+        latencies = []
+        for event in events:
+            start = time.perf_counter_ns()
+            await BreachEventService.create_breach_event(document(event))
+            while RiskScoreQueue.is_pending(event['user_id']):
+                await asyncio.sleep(0.001)
+            await RiskScoreQueue.settle([event['user_id']])
+            latencies.append(time.perf_counter_ns() - start)
+        results.append(summarize('e2e.queued', latencies, len(events), 'events'))
+
+        # Queue running, concurrent writers: insert throughput with scores caught up at the end
+        start_all = time.perf_counter()
+        for offset in range(0, len(events), 50):
+            await asyncio.gather(*(BreachEventService.create_breach_event(document(event))
+                                   for event in events[offset:offset + 50]))
+        await RiskScoreQueue.drain()
+        elapsed = time.perf_counter() - start_all
+        results.append({'name': 'e2e.queued_concurrent', 'calls': 1, 'items': len(events), 'unit': 'events',
+                        'total_s': round(elapsed, 3), 'throughput_per_s': round(len(events) / elapsed, 1)})
+    finally:
+        await RiskScoreQueue.drain()
+        await MongoDB.client.drop_database(BENCH_DB)
+        MongoDB.close()
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]] = None):
+    print(f'{"benchmark":<32} {"calls":>8} {"mean us":>11} {"p50 us":>11} {"p99 us":>11} {"per s":>13}  change')
+    for result in results:
+        change = ''
+        before = (baseline or {}).get(result['name'])
+        if before and before.get('throughput_per_s') and result.get('throughput_per_s'):
+            change = f'{(result["throughput_per_s"] / before["throughput_per_s"] - 1) * 100:+.1f}% throughput'
+        print(f'{result["name"]:<32} {result["calls"]:>8} {result.get("mean_us", ""):>11} '
+              f'{result.get("p50_us", ""):>11} {result.get("p99_us", ""):>11} '
+              f'{result.get("throughput_per_s") or "":>13}  {change}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--zipf-a', type=float, default=1.8, help='power-law exponent of events per user')
+    parser.add_argument('--max-events', type=int, default=5000, help='cap on events for one user')
+    parser.add_argument('--companies', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=15)
+    parser.add_argument('--mongo', action='store_true', help='also run the end-to-end benchmarks against MONGODB_URL')
+    parser.add_argument('--mongo-events', type=int, default=500)
+    parser.add_argument('--debounce', type=float, default=0.05, help='score queue debounce for e2e.queued')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    histories = synthetic_histories(args.users, args.zipf_a, args.max_events, args.companies, rng)
+    devices = {uid: int(n) for uid, n in zip(histories, rng.integers(0, 5, len(histories)))}
+    events_per_user = np.array([len(events) for events in histories.values()])
+
+    results = bench_in_process(histories, devices, args.repeat)
+    if args.mongo:
+        results += asyncio.run(bench_end_to_end(histories, args.mongo_events, args.debounce))
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'params': vars(args),
+        'dataset': {
+            'users': len(histories),
+            'events': int(events_per_user.sum()),
+            'events_per_user': {
+                'p50': float(np.percentile(events_per_user, 50)),
+                'p99': float(np.percentile(events_per_user, 99)),
+                'max': int(events_per_user.max())
+            }
+        },
+        'results': results
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {result['name']: result for result in json.load(f)['results']}
+    print(f'{report["dataset"]["users"]} users, {report["dataset"]["events"]} events, '
+          f'events per user p50 {report["dataset"]["events_per_user"]["p50"]:.0f} '
+          f'p99 {report["dataset"]["events_per_user"]["p99"]:.0f} max {report["dataset"]["events_per_user"]["max"]}')
+    print_table(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""Count MongoDB round trips and latency for each service write path.
+
+First compares the data-access step of each write before and after it returned the stored
+document from the write itself: the old find, write, read-back sequences are replayed next
+to the single find_one_and_update (or insert) the services use now. Then times the full
+service calls, including device upserts and score updates.
+
+Requires a reachable MongoDB (MONGODB_URL). Uses a throwaway database that is dropped afterwards.
+
+    PYTHONPATH=. python benchmarks/write_round_trips.py --iterations 200
+"""
+import argparse
+import asyncio
+import time
+from typing import Tuple
+from pymongo import ReturnDocument, monitoring
+from app.core.db.db import MongoDB
+from app.models.user.user import User
+from app.models.company.company import Company
+from app.models.company.breach_type.breach_type import CompanyBreachType
+from app.models.user.events.event import BreachEvent
+from app.services.users.user_service import UserService
+from app.services.companies.company_service import CompanyService
+from app.services.companies.breach_type.breach_type_service import CompanyBreachService
+from app.services.users.events.breach_event_service import BreachEventService
+
+BENCH_DB = 'team15_bench'
+IGNORED_COMMANDS = {'ping', 'endSessions', 'hello', 'isMaster', 'ismaster'}
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name not in IGNORED_COMMANDS and event.database_name == BENCH_DB:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def time_calls(counter, iterations, make_call) -> Tuple[float, float]:
+    """Round trips and milliseconds per call."""
+    counter.count = 0
+    start = time.perf_counter()
+    for i in range(iterations):
+        await make_call(i)
+    elapsed = time.perf_counter() - start
+    return counter.count / iterations, elapsed / iterations * 1000
+
+
+async def measure(counter, name, iterations, make_call):
+    round_trips, ms = await time_calls(counter, iterations, make_call)
+    print(f'{name:<40} {round_trips:>6.2f} round trips/op  {ms:>8.3f} ms/op')
+
+
+# The sequences the write paths ran before they used the write's own result
+async def find_insert_read(collection, key, document):
+    if await collection.find_one(key):
+        return
+    result = await collection.insert_one({**key, **document})
+    await collection.find_one({'_id': result.inserted_id})
+
+
+async def find_update_read(collection, key, update):
+    if not await collection.find_one(key):
+        return
+    await collection.update_one(key, {'$set': update})
+    await collection.find_one(key)
+
+
+async def update_read(collection, key, update):
+    await collection.update_one(key, {'$set': update})
+    await collection.find_one(key)
+
+
+async def insert_read(collection, document):
+    result = await collection.insert_one(document)
+    return await collection.find_one({'_id': result.inserted_id})
+
+
+# What they run now
+def upsert_returning(collection, key, document):
+    return collection.find_one_and_update(key, {'$setOnInsert': document}, upsert=True,
+                                          return_document=ReturnDocument.AFTER)
+
+
+def update_returning(collection, key, update):
+    return collection.find_one_and_update(key, {'$set': update}, return_document=ReturnDocument.AFTER)
+
+
+async def compare_write_steps(counter, iterations):
+    users = MongoDB.db[UserService.collection_name]
+    companies = MongoDB.db[CompanyService.collection_name]
+    breaches = MongoDB.db[CompanyBreachService.collection_name]
+    events = MongoDB.db[BreachEventService.collection_name]
+    breach = {'breach_type': 'FRAUD', 'effect_score': 70, 'description': 'bench'}
+
+    def event(side, i, severity):
+        return {'user_id': f'{side}{i}', 'company_id': f'{side}CO{i}', 'breach_type': 'FRAUD',
+                'severity': severity, 'status': 'OPEN', 'description': 'bench'}
+
+    async def with_company(side, i, write):
+        # Breach record writes check the company first, before and after
+        await companies.find_one({'id': f'{side}CO{i}'})
+        await write
+
+    event_ids = {'OLD': [], 'NEW': []}
+
+    async def old_insert_event(i):
+        event_ids['OLD'].append((await insert_read(events, event('OLD', i, 'HIGH')))['_id'])
+
+    async def new_insert_event(i):
+        document = event('NEW', i, 'HIGH')
+        await events.insert_one(document)
+        event_ids['NEW'].append(document['_id'])
+
+    steps = [
+        ('create_user',
+         lambda i: find_insert_read(users, {'passport_string': f'OLD{i}'}, {'name': 'Bench User'}),
+         lambda i: upsert_returning(users, {'passport_string': f'NEW{i}'}, {'name': 'Bench User'})),
+        ('update_user',
+         lambda i: find_update_read(users, {'passport_string': f'OLD{i}'}, {'name': 'Renamed'}),
+         lambda i: update_returning(users, {'passport_string': f'NEW{i}'}, {'name': 'Renamed'})),
+        ('create_company',
+         lambda i: find_insert_read(companies, {'id': f'OLDCO{i}'}, {'name': 'Bench Co'}),
+         lambda i: upsert_returning(companies, {'id': f'NEWCO{i}'}, {'name': 'Bench Co'})),
+        ('update_company',
+         lambda i: update_read(companies, {'id': f'OLDCO{i}'}, {'name': 'Renamed Co'}),
+         lambda i: update_returning(companies, {'id': f'NEWCO{i}'}, {'name': 'Renamed Co'})),
+        ('create_breach_record',
+         lambda i: with_company('OLD', i, find_insert_read(breaches, {'company_id': f'OLDCO{i}'}, breach)),
+         lambda i: with_company('NEW', i, upsert_returning(breaches, {'company_id': f'NEWCO{i}'}, breach))),
+        ('update_breach',
+         lambda i: with_company('OLD', i, find_update_read(breaches, {'company_id': f'OLDCO{i}'}, breach)),
+         lambda i: with_company('NEW', i, update_returning(breaches, {'company_id': f'NEWCO{i}'}, breach))),
+        ('insert breach event', old_insert_event, new_insert_event),
+        ('update_breach_event',
+         lambda i: find_update_read(events, {'_id': event_ids['OLD'][i]}, event('OLD', i, 'CRITICAL')),
+         lambda i: update_returning(events, {'_id': event_ids['NEW'][i]}, event('NEW', i, 'CRITICAL'))),
+        ('resolve',
+         lambda i: update_read(events, {'_id': event_ids['OLD'][i]}, {'status': 'CLOSED'}),
+         lambda i: update_returning(events, {'_id': event_ids['NEW'][i]}, {'status': 'CLOSED'})),
+    ]
+    print(f'{"write step":<24}{"before rt/op":>14}{"after rt/op":>13}{"before ms/op":>14}{"after ms/op":>13}')
+    for name, before, after in steps:
+        before_rt, before_ms = await time_calls(counter, iterations, before)
+        after_rt, after_ms = await time_calls(counter, iterations, after)
+        print(f'{name:<24}{before_rt:>14.2f}{after_rt:>13.2f}{before_ms:>14.3f}{after_ms:>13.3f}')
+    print()
+
+
+async def main(iterations: int):
+    counter = CommandCounter()
+    monitoring.register(counter)
+    await MongoDB.initialize(BENCH_DB)
+    if MongoDB.db is None:
+        raise SystemExit('MongoDB is not reachable, set MONGODB_URL')
+    await MongoDB.client.drop_database(BENCH_DB)
+
+    try:
+        await compare_write_steps(counter, iterations)
+
+        # 127.0.0.1 is private, so add_device never reaches the IP reputation provider
+        ip = '127.0.0.1'
+        await measure(counter, 'UserService.create_user', iterations,
+                      lambda i: UserService.create_user(User(name='Bench User', passport_string=f'BENCH{i}'), ip))
+        await measure(counter, 'UserService.update_user', iterations,
+                      lambda i: UserService.update_user(f'BENCH{i}', User(name='Renamed', passport_string=f'BENCH{i}'), ip))
+        await measure(counter, 'CompanyService.create_company', iterations,
+                      lambda i: CompanyService.create_company(Company(id=f'BCOMP{i}', name='Bench Co', industry='Test')))
+        await measure(counter, 'CompanyService.update_company', iterations,
+                      lambda i: CompanyService.update_company(Company(id=f'BCOMP{i}', name='Renamed Co', industry='Test')))
+        breach = CompanyBreachType(breach_type='FRAUD', effect_score=70, description='bench')
+        await measure(counter, 'CompanyBreachService.create_breach_record', iterations,
+                      lambda i: CompanyBreachService.create_breach_record(f'BCOMP{i}', breach))
+        await measure(counter, 'CompanyBreachService.update_breach', iterations,
+                      lambda i: CompanyBreachService.update_breach(f'BCOMP{i}', breach))
+
+        event_ids = []
+
+        async def create_event(i):
+            event = BreachEvent(user_id=f'BENCH{i}', company_id=f'BCOMP{i}', breach_type='FRAUD',
+                                severity='HIGH', status='OPEN', description='bench')
+            created = await BreachEventService.create_breach_event(event)
+            event_ids.append(created['_id'])
+
+        await measure(counter, 'BreachEventService.create_breach_event', iterations, create_event)
+
+        async def update_event(i):
+            event = BreachEvent(user_id=f'BENCH{i}', company_id=f'BCOMP{i}', breach_type='FRAUD',
+                                severity='CRITICAL', status='IN_PROGRESS', description='bench')
+            await BreachEventService.update_breach_event(event_ids[i], event)
+
+        await measure(counter, 'BreachEventService.update_breach_event', iterations, update_event)
+        await measure(counter, 'BreachEventService.resolve', iterations,
+                      lambda i: BreachEventService.resolve(event_ids[i], 'bench'))
+    finally:
+        await MongoDB.client.drop_database(BENCH_DB)
+        MongoDB.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
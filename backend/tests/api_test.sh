@@ -188,6 +188,30 @@ run_tests() {
     CREATE_STATUS=$(curl -s -w "%{http_code}" -o /dev/null -X GET "$BASE_URL/breach-events/$EVENT_ID")
     print_result "/breach-events/ (Create)" "POST" $CREATE_STATUS 200
 
+    # Test 14b: Bulk Create Breach Events
+    BULK_RESPONSE=$(curl -s -X POST "$BASE_URL/breach-events/bulk" \
+        -H "Content-Type: application/json" \
+        -d '[
+            {"user_id": "TEST123", "company_id": "COMP123", "breach_type": "FRAUD", "description": "Bulk event 1", "severity": "LOW", "status": "OPEN"},
+            {"user_id": "TEST123", "company_id": "COMP123", "breach_type": "NOT_A_TYPE", "description": "Bulk event 2", "severity": "LOW", "status": "OPEN"}
+        ]')
+    BULK_CREATED=$(echo "$BULK_RESPONSE" | jq -r '.data.created')
+    BULK_FAILED=$(echo "$BULK_RESPONSE" | jq -r '.data.failed')
+    if [ "$BULK_CREATED" == "1" ] && [ "$BULK_FAILED" == "1" ]; then
+        print_result "/breach-events/bulk (Bulk Create)" "POST" 200 200
+    else
+        print_result "/breach-events/bulk (Bulk Create)" "POST" 500 200
+    fi
+
+    # Test 14c: Create Breach Event with a UTC timestamp
+    TZ_EVENT_RESPONSE=$(curl -s -w "%{http_code}" -X POST "$BASE_URL/breach-events/" \
+        -H "Content-Type: application/json" \
+        -d '{"user_id": "TEST123", "company_id": "COMP123", "breach_type": "FRAUD", "description": "UTC timestamp event", "severity": "MEDIUM", "status": "OPEN", "timestamp": "2025-02-23T00:54:48Z"}')
+    RESPONSE_STATUS=${TZ_EVENT_RESPONSE: -3}
+    print_result "/breach-events/ (Create with Z timestamp)" "POST" $RESPONSE_STATUS 200
+    TZ_EVENT_ID=$(echo "${TZ_EVENT_RESPONSE%???}" | jq -r '.data._id')
+    curl -s -o /dev/null -X DELETE "$BASE_URL/breach-events/$TZ_EVENT_ID"
+
     # Test 15: Get User Breach Events
     GET_EVENTS_RESPONSE=$(curl -s -w "%{http_code}" -X GET "$BASE_URL/breach-events/user/TEST123")
     RESPONSE_STATUS=${GET_EVENTS_RESPONSE: -3}
@@ -218,6 +242,30 @@ run_tests() {
     RESPONSE_STATUS=${GET_UNRESOLVED_RESPONSE: -3}
     print_result "/breach-events/unresolved (Get)" "GET" $RESPONSE_STATUS 200
 
+    # Test 18b: Paginated Breach Events
+    GET_PAGE_RESPONSE=$(curl -s -X GET "$BASE_URL/breach-events/?limit=1")
+    NEXT_CURSOR=$(echo "$GET_PAGE_RESPONSE" | jq -r '.next_cursor // empty')
+    if [ -n "$NEXT_CURSOR" ]; then
+        RESPONSE_STATUS=$(curl -s -o /dev/null -w "%{http_code}" -X GET "$BASE_URL/breach-events/?limit=1&cursor=$NEXT_CURSOR")
+    else
+        RESPONSE_STATUS=$(curl -s -o /dev/null -w "%{http_code}" -X GET "$BASE_URL/breach-events/?limit=1")
+    fi
+    print_result "/breach-events/?limit=1 (Paginate)" "GET" $RESPONSE_STATUS 200
+
+    # Test 18c: Export Breach Events
+    RESPONSE_STATUS=$(curl -s -o /dev/null -w "%{http_code}" -X GET "$BASE_URL/breach-events/export?user_id=TEST123")
+    print_result "/breach-events/export (Export NDJSON)" "GET" $RESPONSE_STATUS 200
+
+    # Test 18d: Search Breach Events
+    RESPONSE_STATUS=$(curl -s -o /dev/null -w "%{http_code}" -X GET "$BASE_URL/breach-events/search?severity=HIGH&severity=CRITICAL&status=OPEN&company_id=COMP123&limit=10&explain=true")
+    print_result "/breach-events/search (Search)" "GET" $RESPONSE_STATUS 200
+
+    # Test 18e: Bulk Status Change
+    RESPONSE_STATUS=$(curl -s -o /dev/null -w "%{http_code}" -X POST "$BASE_URL/breach-events/bulk/resolve" \
+        -H "Content-Type: application/json" \
+        -d '{"filter": {"user_id": "TEST123", "status": ["OPEN"]}, "status": "IN_PROGRESS"}')
+    print_result "/breach-events/bulk/resolve (Bulk Status)" "POST" $RESPONSE_STATUS 200
+
     # Test 19: Resolve Breach Event
     RESOLVE_EVENT_RESPONSE=$(curl -s -w "%{http_code}" -X POST "$BASE_URL/breach-events/$EVENT_ID/resolve?resolution_notes=Issue%20resolved%20and%20verified" \
         -H "Content-Type: application/json")
@@ -262,6 +310,12 @@ run_tests() {
     RESPONSE_STATUS=${GET_USER_DEVICES_RESPONSE: -3}
     print_result "/user-info/devices/TEST123 (Get)" "GET" $RESPONSE_STATUS 200
 
+    # Test 23b: IP Cache Stats and Flush
+    RESPONSE_STATUS=$(curl -s -o /dev/null -w "%{http_code}" -X GET "$BASE_URL/user-info/ip-cache")
+    print_result "/user-info/ip-cache (Stats)" "GET" $RESPONSE_STATUS 200
+    RESPONSE_STATUS=$(curl -s -o /dev/null -w "%{http_code}" -X DELETE "$BASE_URL/user-info/ip-cache?ip_address=8.8.8.8")
+    print_result "/user-info/ip-cache (Flush)" "DELETE" $RESPONSE_STATUS 200
+
     # Test 24: Get Device By Id
     GET_DEVICE_BY_ID_RESPONSE=$(curl -s -w "%{http_code}" -X GET "$BASE_URL/user-info/devices/TEST123")
     RESPONSE_STATUS=${GET_DEVICE_BY_ID_RESPONSE: -3}
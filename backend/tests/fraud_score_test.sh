@@ -86,6 +86,14 @@ else
     echo -e "${RED}✗${NC} Reference score ($SCORE) is unexpectedly low or null: $SCORE_DATA"
 fi
 
+# Events read back right after they were created have not decayed: 0.25 + 0.5 + 0.75 + 1.0
+DECAYED_WEIGHT=$(echo $SCORE_DATA | jq -r '.data.decayed_weight')
+if [ "$DECAYED_WEIGHT" != "null" ] && (( $(echo "$DECAYED_WEIGHT > 2.49 && $DECAYED_WEIGHT <= 2.5" | bc -l) )); then
+    echo -e "${GREEN}✓${NC} Decayed weight ($DECAYED_WEIGHT) matches the undecayed event weights"
+else
+    echo -e "${RED}✗${NC} Decayed weight ($DECAYED_WEIGHT) should be 2.5 for fresh events: $SCORE_DATA"
+fi
+
 echo "Cleaning up test data..."
 
 # Delete test events for user